@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for Process.clean_exit() and Process.clean_exit_at().
+"""
+
+from winappdbg.process import Process
+
+
+class _FakeThread:
+    def __init__(self, waits):
+        self.waits = waits
+
+    def wait(self, dwTimeout=None):
+        self.waits.append(dwTimeout)
+
+
+def _make_process(started, waits, resolved):
+    def start_thread(lpStartAddress, lpParameter=0, bSuspended=False):
+        started.append((lpStartAddress, lpParameter))
+        return _FakeThread(waits)
+
+    def resolve_label(label):
+        resolved.append(label)
+        return 0x76543210
+
+    aProcess = Process(0x1234)
+    aProcess.start_thread = start_thread
+    aProcess.resolve_label = resolve_label
+    return aProcess
+
+
+def test_clean_exit_at():
+    started, waits, resolved = [], [], []
+    aProcess = _make_process(started, waits, resolved)
+    aProcess.clean_exit_at(0x10000, 5)
+    aProcess.clean_exit_at(0x20000, None, bWait=True, dwTimeout=100)
+    assert started == [(0x10000, 5), (0x20000, 0)]
+    assert waits == [100]
+    assert resolved == []
+
+
+def test_clean_exit_resolves_exitprocess_once():
+    started, waits, resolved = [], [], []
+    aProcess = _make_process(started, waits, resolved)
+    aProcess.clean_exit(1)
+    aProcess.clean_exit(2, bWait=True)
+    assert started == [(0x76543210, 1), (0x76543210, 2)]
+    assert waits == [None]
+    assert resolved == ["kernel32!ExitProcess"]
+
+    # The address is looked up again once the snapshot is cleared.
+    aProcess.clear()
+    aProcess.clean_exit(3)
+    assert resolved == ["kernel32!ExitProcess"] * 2
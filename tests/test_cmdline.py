@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for converting argument lists to command lines.
+"""
+
+from winappdbg.system import System
+
+
+def _reference_argv_to_cmdline(argv):
+    # Quoting rules of argv_to_cmdline, written out one case at a time.
+    cmdline = []
+    for token in argv:
+        if not token:
+            token = '""'
+        else:
+            if '"' in token:
+                token = token.replace('"', '\\"')
+            if " " in token or "\t" in token or "\n" in token or "\r" in token:
+                token = '"%s"' % token
+        cmdline.append(token)
+    return " ".join(cmdline)
+
+
+def test_argv_to_cmdline_plain_arguments():
+    argv = ["notepad.exe", "C:\\Windows\\win.ini", "/A", "-x=1"]
+    assert System.argv_to_cmdline(argv) == "notepad.exe C:\\Windows\\win.ini /A -x=1"
+    assert System.argv_to_cmdline([]) == ""
+    assert System.argv_to_cmdline(["", "a"]) == '"" a'
+
+
+def test_argv_to_cmdline_quoting():
+    assert System.argv_to_cmdline(["C:\\Program Files\\x.exe"]) == (
+        '"C:\\Program Files\\x.exe"'
+    )
+    assert System.argv_to_cmdline(['say "hi"']) == '"say \\"hi\\""'
+    assert System.argv_to_cmdline(['a"b']) == 'a\\"b'
+    for whitespace in (" ", "\t", "\n", "\r"):
+        token = "a%sb" % whitespace
+        assert System.argv_to_cmdline([token]) == '"%s"' % token
+
+
+def test_argv_to_cmdline_matches_reference():
+    tokens = ["", "a", "a b", 'a"b', 'a" b', "\t", "x\ny", "x\ry", '"', "\\", "é ü"]
+    for first in tokens:
+        for second in tokens:
+            argv = [first, second]
+            assert System.argv_to_cmdline(argv) == _reference_argv_to_cmdline(argv)
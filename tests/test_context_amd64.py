@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Tests for the AMD64 CONTEXT structure and Context dictionary conversions.
+"""
+
+import ctypes
+import pickle
+
+import pytest
+
+from winappdbg.win32 import context_amd64
+
+
+def _make_context():
+    raw = context_amd64.CONTEXT()
+    raw.ContextFlags = context_amd64.CONTEXT_ALL
+    raw.Rip = 0x7FF612340000
+    raw.Rsp = 0x000000E5F1BFF8A8
+    raw.Rax = 0xFFFFFFFFFFFFFFFF
+    return raw
+
+
+def test_context_registers():
+    for ctx in (
+        _make_context().to_dict(),
+        context_amd64._LazyContext(_make_context()),
+    ):
+        assert ctx.registers() == ()
+        assert ctx.registers("Rip") == (0x7FF612340000,)
+        assert ctx.registers("Rip", "Rsp", "Rax") == (
+            0x7FF612340000,
+            0x000000E5F1BFF8A8,
+            0xFFFFFFFFFFFFFFFF,
+        )
+        with pytest.raises(KeyError):
+            ctx.registers("Rip", "Eip")
+
+
+def _make_vector_context():
+    raw = _make_context()
+    for index in range(26):
+        vector = raw.VectorRegister[index]
+        vector.Low = 0x0123456789ABCDEF + index
+        vector.High = 0x76543210 - index
+    raw.VectorRegister[25].Low = 0xFFFFFFFFFFFFFFFE
+    raw.VectorRegister[25].High = -0x8000000000000000
+    xmm = [getattr(raw.FltSave.xmm, "Xmm%d" % index) for index in range(16)]
+    for index, register in enumerate(xmm):
+        register.Low = 0xFEDCBA9876543210 - index
+        register.High = -1 - index
+    xmm[15].Low = 0
+    xmm[15].High = 0x7FFFFFFFFFFFFFFF
+    return raw
+
+
+def test_context_roundtrip():
+    raw = _make_vector_context()
+    ctx = raw.to_dict()
+    assert len(ctx["VectorRegister"]) == 26
+    assert ctx["VectorRegister"][25] == (-0x8000000000000000 << 64) | (
+        0xFFFFFFFFFFFFFFFE
+    )
+    assert ctx["Xmm0"] == -0x10000000000000000 + 0xFEDCBA9876543210
+    assert ctx["Xmm14"] < 0
+    assert ctx["Xmm15"] == 0x7FFFFFFFFFFFFFFF << 64
+    for source in (ctx, dict(ctx), context_amd64._LazyContext(raw)):
+        copy = context_amd64.CONTEXT.from_dict(source)
+        assert bytes(copy) == bytes(raw)
+        assert copy.to_dict() == ctx
+
+
+def test_context_from_dict_unsigned():
+    raw = _make_vector_context()
+    ctx = dict(raw.to_dict())
+    mask = (1 << 128) - 1
+    for index in range(16):
+        key = "Xmm%d" % index
+        ctx[key] &= mask
+    ctx["VectorRegister"] = [value & mask for value in ctx["VectorRegister"]]
+    assert bytes(context_amd64.CONTEXT.from_dict(ctx)) == bytes(raw)
+
+
+def test_context_from_dict_bad_vector_count():
+    ctx = dict(_make_vector_context().to_dict())
+    ctx["VectorRegister"] = ctx["VectorRegister"][:25]
+    with pytest.raises(ValueError):
+        context_amd64.CONTEXT.from_dict(ctx)
+
+
+def test_ldt_entry_layout():
+    for cls in (context_amd64.LDT_ENTRY, context_amd64.WOW64_LDT_ENTRY):
+        assert ctypes.sizeof(cls) == 8
+        assert cls.LimitLow.offset == 0
+        assert cls.BaseLow.offset == 2
+        assert cls.HighWord.offset == 4
+    assert ctypes.alignment(context_amd64.LDT_ENTRY) == 4
+
+
+def test_xmm_save_area_to_dict():
+    area = context_amd64.XMM_SAVE_AREA32()
+    area.Reserved4[0] = 1
+    area.Reserved4[95] = 0xFF
+    area.XmmRegisters[3].High = -1
+    area.XmmRegisters[3].Low = 0xFFFFFFFFFFFFFFFF
+    d = area.to_dict()
+    assert d["Reserved4"] == b"\x01" + bytes(94) + b"\xff"
+    assert len(d["FloatRegisters"]) == 8
+    assert d["XmmRegisters"][3] == -1
+    assert d["XmmRegisters"][2] == 0
+
+
+def test_set_thread_context_conversions(monkeypatch):
+    written = []
+
+    def SetThreadContext(hThread, lpContext):
+        written.append(bytes(lpContext._obj))
+        return True
+
+    monkeypatch.setitem(
+        context_amd64._kernel32_functions, "SetThreadContext", SetThreadContext
+    )
+    raw = _make_vector_context()
+    assert raw.to_struct() is raw
+    ctx = raw.to_dict()
+    assert bytes(ctx.to_struct()) == bytes(raw)
+    for lpContext in (raw, ctx, dict(ctx), context_amd64._LazyContext(raw)):
+        context_amd64.SetThreadContext(None, lpContext)
+    assert written == [bytes(raw)] * 4
+
+
+def test_set_thread_context_keeps_errors(monkeypatch):
+    # AttributeError raised while converting must not be taken for a plain
+    # dictionary and converted a second time.
+    converted = []
+
+    class BadContext(dict):
+        def to_struct(self):
+            raise AttributeError("bad register")
+
+    monkeypatch.setitem(
+        context_amd64._kernel32_functions, "SetThreadContext", lambda *args: True
+    )
+    monkeypatch.setattr(
+        context_amd64.CONTEXT,
+        "from_dict",
+        classmethod(lambda cls, ctx: converted.append(ctx)),
+    )
+    with pytest.raises(AttributeError):
+        context_amd64.SetThreadContext(None, BadContext())
+    assert converted == []
+
+
+def test_wow64_set_thread_context_conversions(monkeypatch):
+    written = []
+
+    def Wow64SetThreadContext(hThread, lpContext):
+        assert isinstance(lpContext._obj, context_amd64.WOW64_CONTEXT)
+        written.append(bytes(lpContext._obj))
+        return True
+
+    monkeypatch.setitem(
+        context_amd64._kernel32_functions,
+        "Wow64SetThreadContext",
+        Wow64SetThreadContext,
+    )
+    raw = context_amd64.WOW64_CONTEXT()
+    raw.ContextFlags = context_amd64.WOW64_CONTEXT_ALL
+    raw.Eip = 0x401000
+    raw.Esp = 0x12FF00
+    raw.Eax = 0xFFFFFFFF
+    ctx = raw.to_dict()
+    i386 = context_amd64.context_i386.CONTEXT.from_dict(ctx)
+    for lpContext in (raw, i386, ctx, dict(ctx)):
+        context_amd64.Wow64SetThreadContext(None, lpContext)
+    assert written == [bytes(raw)] * 4
+
+
+def test_get_thread_context_defaults(monkeypatch):
+    requested = []
+
+    def GetThreadContext(hThread, lpContext):
+        requested.append(lpContext._obj.ContextFlags)
+        lpContext._obj.Rip = 0x1000
+        return True
+
+    monkeypatch.setitem(
+        context_amd64._kernel32_functions, "GetThreadContext", GetThreadContext
+    )
+    ctx = context_amd64.GetThreadContext(None)
+    raw = context_amd64.GetThreadContext(None, context_amd64.CONTEXT_CONTROL, raw=True)
+    assert requested == [context_amd64.CONTEXT_ALL, context_amd64.CONTEXT_CONTROL]
+    assert isinstance(ctx, context_amd64.Context)
+    assert ctx["ContextFlags"] == context_amd64.CONTEXT_ALL
+    assert ctx.pc == 0x1000
+    assert isinstance(raw, context_amd64.CONTEXT)
+
+
+def test_lazy_context_lookups():
+    raw = _make_vector_context()
+    ctx = raw.to_dict()
+    lazy = context_amd64._LazyContext(raw)
+    assert lazy["Rip"] == ctx["Rip"]
+    assert lazy.get("Rsp") == ctx["Rsp"]
+    assert lazy.get("Eip", 1) == 1
+    assert "Rax" in lazy
+    assert lazy.pc == ctx["Rip"]
+    assert lazy["Xmm0"] == ctx["Xmm0"]
+    assert dict.get(lazy, "ContextFlags") == ctx["ContextFlags"]
+
+
+def test_lazy_context_materializes():
+    raw = _make_vector_context()
+    ctx = raw.to_dict()
+    for operation in (
+        dict,
+        len,
+        list,
+        repr,
+        lambda lazy: lazy == ctx,
+        lambda lazy: lazy.items(),
+        lambda lazy: lazy.copy(),
+        lambda lazy: lazy.update(Rip=0),
+        lambda lazy: lazy.pop("Rip"),
+        lambda lazy: lazy.__setitem__("Rip", 0),
+        lambda lazy: {**lazy},
+    ):
+        lazy = context_amd64._LazyContext(raw)
+        operation(lazy)
+        assert type(lazy) is context_amd64.Context, operation
+    lazy = context_amd64._LazyContext(raw)
+    assert dict(lazy) == ctx
+    lazy = context_amd64._LazyContext(raw)
+    lazy["Rip"] = 5
+    assert lazy["Rip"] == 5
+    assert lazy["Rax"] == ctx["Rax"]
+
+
+def test_context_slots_and_pickle():
+    raw = _make_vector_context()
+    ctx = raw.to_dict()
+    assert not hasattr(ctx, "__dict__")
+    with pytest.raises(AttributeError):
+        ctx.foo = 1
+    for source in (ctx, context_amd64._LazyContext(raw)):
+        copy = pickle.loads(pickle.dumps(source))
+        assert type(copy) is context_amd64.Context
+        assert copy == ctx
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the i386 CONTEXT structure and Context dictionary conversions.
+"""
+
+import ctypes
+import random
+
+from winappdbg.win32 import context_i386
+
+
+def _make_context(ContextFlags):
+    raw = context_i386.CONTEXT()
+    rng = random.Random(386)
+    data = bytes(rng.getrandbits(8) for _ in range(ctypes.sizeof(raw)))
+    ctypes.memmove(ctypes.addressof(raw), data, len(data))
+    raw.ContextFlags = ContextFlags
+    return raw
+
+
+def test_context_to_dict():
+    raw = _make_context(context_i386.CONTEXT_ALL)
+    ctx = raw.to_dict()
+    for key in (
+        context_i386.CONTEXT._ctx_debug
+        + context_i386.CONTEXT._ctx_segs
+        + context_i386.CONTEXT._ctx_int
+        + context_i386.CONTEXT._ctx_ctrl
+    ):
+        assert ctx[key] == getattr(raw, key), key
+    assert ctx["ContextFlags"] == context_i386.CONTEXT_ALL
+    assert ctx.pc == raw.Eip
+    assert ctx.sp == raw.Esp
+
+
+def test_context_to_dict_partial():
+    raw = _make_context(context_i386.CONTEXT_CONTROL)
+    ctx = raw.to_dict()
+    assert ctx["Eip"] == raw.Eip
+    assert "Eax" not in ctx
+    assert "Dr7" not in ctx
+    assert "SegDs" not in ctx
+
+
+def test_context_roundtrip():
+    for ContextFlags in (
+        context_i386.CONTEXT_CONTROL,
+        context_i386.CONTEXT_CONTROL | context_i386.CONTEXT_INTEGER,
+        context_i386.CONTEXT_ALL,
+    ):
+        ctx = _make_context(ContextFlags).to_dict()
+        assert context_i386.CONTEXT.from_dict(ctx).to_dict() == ctx
+
+
+def test_context_to_struct():
+    raw = _make_context(context_i386.CONTEXT_ALL)
+    assert raw.to_struct() is raw
+    ctx = raw.to_dict()
+    assert bytes(ctx.to_struct()) == bytes(context_i386.CONTEXT.from_dict(ctx))
+    assert ctx.to_struct().to_dict() == ctx
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Tests for Process.inject_dll() and the memory it leaves in the process.
+"""
+
+import struct
+
+import pytest
+
+from winappdbg import win32
+from winappdbg.process import Process
+from winappdbg.thread import Thread
+
+_EXPORTS = {
+    "LoadLibraryA": 0x76501230,
+    "LoadLibraryW": 0x76501000,
+    "GetProcAddress": 0x76504560,
+    "VirtualFree": 0x76507890,
+}
+
+
+def _reference_shellcode(dllname, procname, lpParameter, bWait):
+    # The shellcode as inject_dll() used to build it, one piece at a time.
+    pack = struct.Struct("<L").pack
+    code = b""
+    if bWait:
+        code += b"\x55"
+    code += b"\xe8" + pack(len(dllname) + 1) + dllname.encode("ascii") + b"\0"
+    code += b"\xb8" + pack(_EXPORTS["LoadLibraryA"]) + b"\xff\xd0"
+    code += b"\xe8" + pack(len(procname) + 1) + procname.encode("ascii") + b"\0"
+    code += b"\x50" + b"\xb8" + pack(_EXPORTS["GetProcAddress"]) + b"\xff\xd0"
+    code += b"\x8b\xec" + b"\x68" + pack(lpParameter)
+    code += b"\xff\xd0" + b"\x8b\xe5"
+    if bWait:
+        code += b"\x5d\xc2\x04\x00"
+    else:
+        code += b"\x5a"
+        code += b"\x68" + pack(win32.MEM_RELEASE)
+        code += b"\x68" + pack(0x1000)
+        code += b"\xe8\x00\x00\x00\x00"
+        code += b"\x81\x24\x24\x00\xf0\xff\xff"
+        code += b"\xb8" + pack(_EXPORTS["VirtualFree"])
+        code += b"\x52"
+        code += b"\xff\xe0"
+    return code
+
+
+class _FakeModule:
+    def resolve(self, name):
+        return _EXPORTS.get(name)
+
+
+class _FakeThread:
+    def _join_and_reclaim(self, dwTimeout=None):
+        pass
+
+
+def _make_process(injected):
+    def inject_code(payload, lpParameter=0):
+        injected.append((payload, lpParameter))
+        return _FakeThread(), 0x10000
+
+    aProcess = Process(0x1234)
+    aProcess.get_module_by_name = lambda name: _FakeModule()
+    aProcess.get_arch = lambda: win32.ARCH_I386
+    aProcess.inject_code = inject_code
+    return aProcess
+
+
+def test_inject_dll_shellcode_matches_reference():
+    injected = []
+    aProcess = _make_process(injected)
+    calls = [
+        ("hook.dll", "Install", 0, False),
+        ("C:\\Some Path\\hook.dll", "Init", 0xDEADBEEF, False),
+        ("hook.dll", "Install", 0x1234, True),
+        ("a.dll", "b", 0xFFFFFFFF, True),
+    ]
+    for dllname, procname, lpParameter, bWait in calls:
+        aProcess.inject_dll(dllname, procname, lpParameter, bWait=bWait)
+    assert len(injected) == len(calls)
+    for (payload, lpParameter), call in zip(injected, calls):
+        assert payload == _reference_shellcode(*call)
+        assert lpParameter == call[2]
+
+
+def test_inject_dll_shellcode_template_is_not_modified():
+    # The same template is reused, so names of different lengths in a row
+    # must not leave anything behind from the previous call.
+    injected = []
+    aProcess = _make_process(injected)
+    aProcess.inject_dll("a_much_longer_library_name.dll", "LongProcedureName", 1)
+    aProcess.inject_dll("x.dll", "y", 2)
+    aProcess.inject_dll("a_much_longer_library_name.dll", "LongProcedureName", 1)
+    assert injected[0] == injected[2]
+    assert injected[1][0] == _reference_shellcode("x.dll", "y", 2, True)
+
+
+class _FakeHandle:
+    def close(self):
+        pass
+
+
+class _FakeRemoteMemory:
+    # Stands in for the remote memory functions used by inject_dll().
+    def __init__(self, monkeypatch):
+        self.allocated = []
+        self.written = []
+        self.freed = []
+        monkeypatch.setattr(win32, "VirtualAllocEx", self.VirtualAllocEx)
+        monkeypatch.setattr(win32, "WriteProcessMemory", self.WriteProcessMemory)
+        monkeypatch.setattr(win32, "VirtualFreeEx", self.VirtualFreeEx)
+
+    def VirtualAllocEx(
+        self,
+        hProcess,
+        lpAddress=0,
+        dwSize=0x1000,
+        flAllocationType=win32.MEM_COMMIT | win32.MEM_RESERVE,
+        flProtect=win32.PAGE_EXECUTE_READWRITE,
+    ):
+        self.allocated.append((dwSize, flProtect))
+        return 0x30000
+
+    def WriteProcessMemory(self, hProcess, lpBaseAddress, lpBuffer):
+        self.written.append((lpBaseAddress, lpBuffer))
+        return len(lpBuffer)
+
+    def VirtualFreeEx(self, hProcess, lpAddress, dwSize=0, dwFreeType=None):
+        self.freed.append(lpAddress)
+
+
+def _make_loader_process(freed, running, started=None):
+    # Process whose inject_dll() loader threads keep running while the flag
+    # in running[0] is set when they're started, so waiting for them times out.
+    def start_thread(lpStartAddress, lpParameter=0, bSuspended=False):
+        aThread = Thread(0x5678, process=aProcess)
+        aThread.running = running[0]
+
+        def wait(dwTimeout=None):
+            if aThread.running:
+                raise WindowsError(win32.WAIT_TIMEOUT, "timeout")
+
+        aThread.wait = wait
+        if started is not None:
+            started.append((aThread, lpParameter))
+        return aThread
+
+    aProcess = Process(0x1234)
+    aProcess.hProcess = _FakeHandle()
+    aProcess.get_handle = lambda dwDesiredAccess=None: aProcess.hProcess
+    aProcess.get_module_by_name = lambda name: _FakeModule()
+    aProcess.malloc_and_write = lambda lpBuffer: 0x20000
+    aProcess.start_thread = start_thread
+    aProcess.free = freed.append
+    return aProcess
+
+
+def test_inject_dll_frees_library_name(monkeypatch):
+    remote = _FakeRemoteMemory(monkeypatch)
+    freed = []
+    aProcess = _make_loader_process(freed, [False])
+    longname = "x" * 0x800 + ".dll"
+    aThread = aProcess.inject_dll(longname, bWait=True)
+    assert freed == [0x20000]
+    assert aThread.pInjectedMemory is None
+
+    aThread = aProcess.inject_dll("hook.dll", bWait=False)
+    assert freed == [0x20000]
+    assert aThread.pInjectedMemory == 0x20000
+    assert remote.allocated == []
+
+
+def test_inject_dll_pools_short_library_names(monkeypatch):
+    remote = _FakeRemoteMemory(monkeypatch)
+    freed = []
+    started = []
+    aProcess = _make_loader_process(freed, [False], started)
+    for dllname in ("hook.dll", "other.dll", "hook.dll"):
+        aThread = aProcess.inject_dll(dllname, bWait=True)
+        assert aThread.pInjectedMemory is None
+    assert freed == []
+    assert remote.allocated == [(0x1000, win32.PAGE_READWRITE)]
+    assert [lpParameter for _, lpParameter in started] == [0x30000] * 3
+    assert remote.written[1] == (0x30000, "other.dll\0".encode("utf-16le"))
+
+    aProcess.close_handle()
+    assert remote.freed == [0x30000]
+    assert aProcess.hProcess is None
+
+
+def test_inject_dll_retires_pool_slot_on_timeout(monkeypatch):
+    remote = _FakeRemoteMemory(monkeypatch)
+    freed = []
+    started = []
+    running = [True]
+    aProcess = _make_loader_process(freed, running, started)
+    with pytest.raises(WindowsError):
+        aProcess.inject_dll("hook.dll", bWait=True, dwTimeout=100)
+    running[0] = False
+    aProcess.inject_dll("hook.dll", bWait=True)
+    aProcess.inject_dll("hook.dll", bWait=True)
+    assert [lpParameter for _, lpParameter in started] == [0x30000, 0x30400, 0x30400]
+
+    # The page stays while the timed out thread may still read from it.
+    aProcess.close_handle()
+    assert remote.freed == []
+    started[0][0].running = False
+    aProcess.hProcess = _FakeHandle()
+    aProcess.clear()
+    assert remote.freed == [0x30000]
+    assert freed == []
+
+
+def test_join_and_reclaim_keeps_memory_on_timeout():
+    freed = []
+    aProcess = _make_loader_process(freed, [True])
+    aThread = aProcess.start_thread(0)
+    aThread.pInjectedMemory = 0x20000
+    with pytest.raises(WindowsError):
+        aThread._join_and_reclaim(100)
+    assert freed == []
+    assert aThread.pInjectedMemory == 0x20000
+
+    aThread.wait = lambda dwTimeout=None: None
+    aThread._join_and_reclaim(100)
+    assert freed == [0x20000]
+    assert aThread.pInjectedMemory is None
+
+
+def test_inject_dll_pools_long_library_names(monkeypatch):
+    remote = _FakeRemoteMemory(monkeypatch)
+    freed = []
+    started = []
+    running = [True]
+    aProcess = _make_loader_process(freed, running, started)
+    with pytest.raises(WindowsError):
+        aProcess.inject_dll("hook.dll", bWait=True, dwTimeout=100)
+    running[0] = False
+
+    # Names longer than a slot take consecutive slots, which have to fit
+    # after the retired first one.
+    aProcess.inject_dll("x" * 0x200 + ".dll", bWait=True)
+    aProcess.inject_dll("x" * 0x500 + ".dll", bWait=True)
+    assert freed == []
+    assert [lpParameter for _, lpParameter in started] == [0x30000, 0x30400, 0x30400]
+
+    # Once the first thread finishes, a name as long as the page fits.
+    started[0][0].running = False
+    aProcess.inject_dll("x" * 0x7F0 + ".dll", bWait=True)
+    assert freed == []
+    assert started[-1][1] == 0x30000
+    assert remote.allocated == [(0x1000, win32.PAGE_READWRITE)]
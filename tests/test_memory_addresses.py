@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for the MemoryAddresses helper class.
+"""
+
+from winappdbg.util import MemoryAddresses
+
+
+def test_align_address_range():
+    pageSize = MemoryAddresses.pageSize
+    align = MemoryAddresses.align_address_range
+    assert align(0, pageSize) == (0, pageSize)
+    assert align(1, pageSize) == (0, pageSize)
+    assert align(pageSize + 1, pageSize * 2 + 1) == (pageSize, pageSize * 3)
+    assert align(pageSize * 3 - 1, pageSize + 1) == (pageSize, pageSize * 3)
+    assert align(None, pageSize - 1)[0] == 0
+    begin, end = align(pageSize, None)
+    assert begin == pageSize
+    assert end > begin
+
+
+def test_align_address_range_cached():
+    pageSize = MemoryAddresses.pageSize
+    align = MemoryAddresses.align_address_range
+    hits = align.cache_info().hits
+    first = align(pageSize * 7 + 3, pageSize * 9 + 5)
+    second = align(pageSize * 7 + 3, pageSize * 9 + 5)
+    assert first == second == (pageSize * 7, pageSize * 10)
+    assert align.cache_info().hits == hits + 1
+
+
+def test_get_buffer_size_in_pages():
+    pageSize = MemoryAddresses.pageSize
+    pages = MemoryAddresses.get_buffer_size_in_pages
+    assert pages(0, pageSize) == 1
+    assert pages(pageSize - 1, 2) == 2
+    assert pages(pageSize * 2, -1) == 1
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for resolving the exports of a Module.
+"""
+
+import os
+
+from winappdbg import win32
+from winappdbg.module import Module
+from winappdbg.process import Process
+
+
+def test_resolve_caches_exports(monkeypatch):
+    lookups = []
+    exports = {"LoadLibraryW": 0x10001230, "GetProcAddress": 0x10004560}
+
+    def GetProcAddress(hModule, lpProcName):
+        lookups.append(lpProcName)
+        return exports.get(lpProcName)
+
+    monkeypatch.setattr(win32, "GetModuleHandle", lambda filename: 0x10000000)
+    monkeypatch.setattr(win32, "GetProcAddress", GetProcAddress)
+    aModule = Module(0x70000000, fileName="C:\\Windows\\System32\\kernel32.dll")
+
+    assert aModule.resolve("LoadLibraryW") == 0x70001230
+    assert aModule.resolve("LoadLibraryW") == 0x70001230
+    assert aModule.resolve("GetProcAddress") == 0x70004560
+    assert lookups == ["LoadLibraryW", "GetProcAddress"]
+
+    # Failed lookups are not cached.
+    assert aModule.resolve("Missing") is None
+    assert aModule.resolve("Missing") is None
+    assert lookups == ["LoadLibraryW", "GetProcAddress", "Missing", "Missing"]
+
+    # Each Module object has its own cache.
+    other = Module(0x60000000, fileName="C:\\Windows\\System32\\kernel32.dll")
+    assert other.resolve("LoadLibraryW") == 0x60001230
+
+
+def test_resolve_own_kernel32():
+    aProcess = Process(os.getpid())
+    aProcess.scan_modules()
+    aModule = aProcess.get_module_by_name("kernel32.dll")
+    address = aModule.resolve("GetProcAddress")
+    hModule = win32.GetModuleHandle("kernel32.dll")
+    assert address == win32.GetProcAddress(hModule, "GetProcAddress")
+    assert aModule.resolve("GetProcAddress") == address
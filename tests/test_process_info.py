@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the information cached by Process objects.
+"""
+
+import ctypes
+import os
+
+from winappdbg import win32
+from winappdbg.module import _ModuleContainer
+from winappdbg.process import Process
+from winappdbg.thread import _ThreadContainer
+
+
+def test_get_arch_own_process():
+    aProcess = Process(os.getpid())
+    arch = aProcess.get_arch()
+    assert arch != win32.ARCH_UNKNOWN
+    assert aProcess.get_arch() == arch
+    assert aProcess.get_bits() == ctypes.sizeof(ctypes.c_void_p) * 8
+
+
+def test_get_arch_is_queried_once():
+    handles = []
+
+    def get_handle(dwDesiredAccess=win32.PROCESS_ALL_ACCESS):
+        handles.append(dwDesiredAccess)
+        raise WindowsError(win32.ERROR_ACCESS_DENIED, "access denied")
+
+    aProcess = Process(0x1234)
+    aProcess.get_handle = get_handle
+    arch = aProcess.get_arch()
+    assert handles
+    count = len(handles)
+    assert aProcess.get_arch() == arch
+    assert len(handles) == count
+
+
+def test_notify_create_process_runs_both(monkeypatch):
+    calls = []
+
+    def notify(name, result):
+        def _notify_create_process(self, event):
+            calls.append(name)
+            return result
+
+        return _notify_create_process
+
+    aProcess = Process(0x1234)
+    for threads, modules in ((False, True), (True, False), (True, True)):
+        monkeypatch.setattr(
+            _ThreadContainer, "_notify_create_process", notify("threads", threads)
+        )
+        monkeypatch.setattr(
+            _ModuleContainer, "_notify_create_process", notify("modules", modules)
+        )
+        del calls[:]
+        assert aProcess._notify_create_process(None) == (threads and modules)
+        assert calls == ["threads", "modules"]
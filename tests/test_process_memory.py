@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Tests for the Process memory allocation and snapshot methods.
+"""
+
+import ctypes
+import os
+import threading
+
+import pytest
+
+from winappdbg import win32
+from winappdbg.process import Process
+
+
+def test_malloc_and_write():
+    aProcess = Process(os.getpid())
+    data = b"winappdbg\0" * 100
+    lpAddress = aProcess.malloc_and_write(data)
+    try:
+        assert aProcess.read(lpAddress, len(data)) == data
+    finally:
+        aProcess.free(lpAddress)
+
+
+def test_malloc_and_write_frees_on_short_write(monkeypatch):
+    freed = []
+    monkeypatch.setattr(win32, "VirtualAllocEx", lambda *args: 0x10000)
+    monkeypatch.setattr(win32, "WriteProcessMemory", lambda *args: 3)
+    monkeypatch.setattr(
+        win32, "VirtualFreeEx", lambda hProcess, lpAddress: freed.append(lpAddress)
+    )
+    aProcess = Process(0x1234)
+    aProcess.get_handle = lambda *args: None
+    with pytest.raises(WindowsError):
+        aProcess.malloc_and_write(b"12345")
+    assert freed == [0x10000]
+
+
+def test_is_buffer_executable_and_writeable():
+    aProcess = Process(os.getpid())
+    lpAddress = aProcess.malloc(0x2000)
+    try:
+        for flProtect, bExecutable, bWriteable in (
+            (win32.PAGE_EXECUTE_READWRITE, True, True),
+            (win32.PAGE_EXECUTE_READ, True, False),
+            (win32.PAGE_READWRITE, False, True),
+        ):
+            aProcess.mprotect(lpAddress, 0x2000, flProtect)
+            assert aProcess.is_buffer_executable(lpAddress, 0x2000) == bExecutable
+            assert aProcess.is_buffer_writeable(lpAddress, 0x2000) == bWriteable
+            assert aProcess.is_buffer_executable_and_writeable(lpAddress, 0x2000) == (
+                bExecutable and bWriteable
+            )
+
+        # Only one of the two pages is read-only.
+        aProcess.mprotect(lpAddress, 0x2000, win32.PAGE_EXECUTE_READWRITE)
+        aProcess.mprotect(lpAddress + 0x1000, 0x1000, win32.PAGE_EXECUTE_READ)
+        assert aProcess.is_buffer_executable_and_writeable(lpAddress, 0x1000)
+        assert not aProcess.is_buffer_executable_and_writeable(lpAddress, 0x2000)
+    finally:
+        aProcess.free(lpAddress)
+
+
+def test_is_buffer_executable_and_writeable_walks_regions(monkeypatch):
+    regions = [
+        (0x10000, 0x1000, win32.PAGE_EXECUTE_READWRITE),
+        (0x11000, 0x1000, win32.PAGE_EXECUTE_WRITECOPY),
+        (0x12000, 0x1000, win32.PAGE_EXECUTE_READ),
+    ]
+
+    def NtQueryVirtualMemory(hProcess, address):
+        for base, size, protect in regions:
+            if base <= address < base + size:
+                mbi = win32.MemoryBasicInformation()
+                mbi.BaseAddress = base
+                mbi.RegionSize = size
+                mbi.State = win32.MEM_COMMIT
+                mbi.Protect = protect
+                return mbi
+        raise ctypes.WinError(win32.ERROR_INVALID_PARAMETER)
+
+    monkeypatch.setattr(win32, "NtQueryVirtualMemory", NtQueryVirtualMemory)
+    aProcess = Process(0x1234)
+    aProcess.get_handle = lambda *args: None
+    assert aProcess.is_buffer_executable_and_writeable(0x10000, 0x2000)
+    assert aProcess.is_buffer_executable_and_writeable(0x10800, 0x1000)
+    assert not aProcess.is_buffer_executable_and_writeable(0x10000, 0x3000)
+    assert not aProcess.is_buffer_executable_and_writeable(0x12000, 0x10)
+    assert not aProcess.is_buffer_executable_and_writeable(0x11000, 0x3000)
+    assert aProcess.is_buffer_executable(0x10000, 0x3000)
+    with pytest.raises(ValueError):
+        aProcess.is_buffer_executable_and_writeable(0x10000, 0)
+
+
+def _fake_process(regions, memory, reads):
+    # Process whose memory map and contents come from the given lists.
+    # regions is a list of (address, size, protect) tuples.
+    def get_memory_map(minAddr=None, maxAddr=None):
+        memory_map = []
+        for address, size, protect in regions:
+            mbi = win32.MemoryBasicInformation()
+            mbi.BaseAddress = address
+            mbi.AllocationBase = address
+            mbi.RegionSize = size
+            mbi.State = win32.MEM_COMMIT
+            mbi.Protect = protect
+            mbi.Type = win32.MEM_PRIVATE
+            memory_map.append(mbi)
+        return memory_map
+
+    def read(address, size):
+        reads.append(address)
+        return bytes(memory[address : address + size])
+
+    aProcess = Process(0x1234)
+    aProcess.get_memory_map = get_memory_map
+    aProcess.get_handle = lambda *args: None
+    aProcess.read = read
+    return aProcess
+
+
+def test_take_incremental_memory_snapshot():
+    pageSize = 0x1000
+    memory = bytearray(b"A" * pageSize + b"B" * pageSize + b"C" * pageSize)
+    regions = [
+        (0, pageSize, win32.PAGE_READONLY),
+        (pageSize, pageSize, win32.PAGE_READWRITE),
+        (pageSize * 2, pageSize, win32.PAGE_EXECUTE_READ),
+    ]
+    reads = []
+    aProcess = _fake_process(regions, memory, reads)
+    snapshot = aProcess.take_memory_snapshot()
+    assert [mbi.content for mbi in snapshot] == [
+        b"A" * pageSize,
+        b"B" * pageSize,
+        b"C" * pageSize,
+    ]
+    assert sorted(reads) == [0, pageSize, pageSize * 2]
+
+    # Only the writeable region is read again.
+    memory[:] = b"a" * pageSize + b"b" * pageSize + b"c" * pageSize
+    del reads[:]
+    snapshot = aProcess.take_incremental_memory_snapshot(snapshot)
+    assert reads == [pageSize]
+    assert [mbi.content for mbi in snapshot] == [
+        b"A" * pageSize,
+        b"b" * pageSize,
+        b"C" * pageSize,
+    ]
+
+    # Regions whose protection changed are read again too.
+    regions[2] = (pageSize * 2, pageSize, win32.PAGE_EXECUTE_READWRITE)
+    del reads[:]
+    snapshot = aProcess.take_incremental_memory_snapshot(snapshot)
+    assert sorted(reads) == [pageSize, pageSize * 2]
+    assert snapshot[2].content == b"c" * pageSize
+
+
+def test_take_incremental_memory_snapshot_sparse():
+    pageSize = 0x1000
+    memory = bytearray(pageSize * 2)
+    memory[10] = 1
+    regions = [(0, pageSize * 2, win32.PAGE_READONLY)]
+    reads = []
+    aProcess = _fake_process(regions, memory, reads)
+    snapshot = aProcess.take_memory_snapshot(bSparse=True)
+    del reads[:]
+    snapshot = aProcess.take_incremental_memory_snapshot(snapshot)
+    assert reads == []
+    assert bytes(snapshot[0].content) == bytes(memory)
+
+
+def _snapshot_threads(regions, memory):
+    reads = []
+    aProcess = _fake_process(regions, memory, reads)
+    threads = set()
+    read = aProcess.read
+
+    def read_from_thread(address, size):
+        threads.add(threading.current_thread())
+        return read(address, size)
+
+    aProcess.read = read_from_thread
+    snapshot = aProcess.take_memory_snapshot()
+    assert [mbi.BaseAddress for mbi in snapshot] == [r[0] for r in regions]
+    for mbi in snapshot:
+        address = mbi.BaseAddress
+        assert mbi.content == bytes(memory[address : address + mbi.RegionSize])
+    assert sorted(reads) == [r[0] for r in regions]
+    return threads
+
+
+def test_take_memory_snapshot_small_map_reads_inline():
+    pageSize = 0x1000
+    memory = bytes(range(256)) * (pageSize * 4 // 256)
+    regions = [
+        (address, pageSize, win32.PAGE_READWRITE)
+        for address in range(0, len(memory), pageSize)
+    ]
+    assert _snapshot_threads(regions, memory) == {threading.current_thread()}
+
+
+def test_take_memory_snapshot_large_map_reads_ahead():
+    regionSize = 0x100000
+    memory = bytes(range(251)) * (regionSize * 12 // 251 + 1)
+    regions = [
+        (address, regionSize, win32.PAGE_READWRITE)
+        for address in range(0, regionSize * 12, regionSize)
+    ]
+    assert len(_snapshot_threads(regions, memory)) > 1
+
+
+def test_restore_memory_snapshot_skips_unchanged(monkeypatch):
+    pageSize = 0x1000
+    memory = bytearray(b"A" * pageSize + b"B" * pageSize)
+    regions = [
+        (0, pageSize, win32.PAGE_READWRITE),
+        (pageSize, pageSize, win32.PAGE_READWRITE),
+    ]
+    reads = []
+    written = []
+
+    def poke(address, data):
+        written.append(address)
+        memory[address : address + len(data)] = data
+
+    aProcess = _fake_process(regions, memory, reads)
+    memory_map = {mbi.BaseAddress: mbi for mbi in aProcess.get_memory_map()}
+    aProcess.mquery = lambda address: win32.MemoryBasicInformation(memory_map[address])
+    aProcess.suspend = aProcess.resume = lambda: None
+    aProcess.poke = aProcess.write = poke
+    monkeypatch.setattr(
+        win32,
+        "ReadProcessMemory",
+        lambda hProcess, address, size: bytes(memory[address : address + size]),
+    )
+    for bSparse in (False, True):
+        snapshot = aProcess.take_memory_snapshot(bSparse=bSparse)
+        memory[pageSize : pageSize + 4] = b"XXXX"
+        del written[:]
+        aProcess.restore_memory_snapshot(snapshot, bSkipMappedFiles=False)
+        assert written == [pageSize]
+        assert memory == b"A" * pageSize + b"B" * pageSize
+
+
+def test_restore_memory_snapshot_probes_first_and_last_page(monkeypatch):
+    pageSize = 0x1000
+    memory = bytearray(b"A" * pageSize * 4)
+    regions = [(0, pageSize * 4, win32.PAGE_READWRITE)]
+    reads = []
+    written = []
+
+    def poke(address, data):
+        written.append(address)
+        memory[address : address + len(data)] = data
+
+    def ReadProcessMemory(hProcess, address, size):
+        reads.append((address, size))
+        return bytes(memory[address : address + size])
+
+    aProcess = _fake_process(regions, memory, [])
+    memory_map = {mbi.BaseAddress: mbi for mbi in aProcess.get_memory_map()}
+    aProcess.mquery = lambda address: win32.MemoryBasicInformation(memory_map[address])
+    aProcess.suspend = aProcess.resume = lambda: None
+    aProcess.poke = aProcess.write = poke
+    monkeypatch.setattr(win32, "ReadProcessMemory", ReadProcessMemory)
+    for bSparse in (False, True):
+        snapshot = aProcess.take_memory_snapshot(bSparse=bSparse)
+
+        # A change in the last page is found without reading the rest.
+        memory[-1] = 0x42
+        del reads[:], written[:]
+        aProcess.restore_memory_snapshot(snapshot, bSkipMappedFiles=False)
+        assert reads == [(0, pageSize), (pageSize * 3, pageSize)]
+        assert written == [0]
+        assert memory == b"A" * pageSize * 4
+
+        # Unchanged regions are read once in full, and not written.
+        del reads[:], written[:]
+        aProcess.restore_memory_snapshot(snapshot, bSkipMappedFiles=False)
+        assert sum(size for _, size in reads) == pageSize * 4
+        assert written == []
+
+        # A change in the middle is found by the full read.
+        memory[pageSize * 2] = 0x42
+        del written[:]
+        aProcess.restore_memory_snapshot(snapshot, bSkipMappedFiles=False)
+        assert written == [0]
+        assert memory == b"A" * pageSize * 4
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the SparseBuffer class used by memory snapshots.
+"""
+
+import pytest
+
+from winappdbg import util
+from winappdbg.util import MemoryAddresses, SparseBuffer
+
+
+def _make_data():
+    pageSize = MemoryAddresses.pageSize
+    data = bytearray(pageSize * 4 + 100)
+    data[10:20] = b"A" * 10
+    data[pageSize * 2 + 5] = 0x42
+    data[pageSize * 3 - 1] = 0x43
+    data[-3:] = b"xyz"
+    return bytes(data)
+
+
+def test_sparsebuffer_drops_zero_pages():
+    pageSize = MemoryAddresses.pageSize
+    data = _make_data()
+    buf = SparseBuffer(data)
+    assert len(buf) == len(data)
+    assert sorted(buf.pages) == [0, pageSize * 2, pageSize * 4]
+    assert bytes(buf) == data
+    assert buf == data
+    assert SparseBuffer(bytes(pageSize * 2)).pages == {}
+
+
+def test_sparsebuffer_without_numpy(monkeypatch):
+    data = _make_data()
+    expected = SparseBuffer(data).pages
+    monkeypatch.setattr(util, "_numpy", None)
+    assert SparseBuffer(data).pages == expected
+
+
+def test_sparsebuffer_getitem_index():
+    data = _make_data()
+    buf = SparseBuffer(data)
+    for index in list(range(-len(data), len(data), 97)) + [10, -1, -3]:
+        assert buf[index] == data[index]
+    with pytest.raises(IndexError):
+        buf[len(data)]
+    with pytest.raises(IndexError):
+        buf[-len(data) - 1]
+    with pytest.raises(TypeError):
+        buf["0"]
+
+
+def test_sparsebuffer_getitem_slice():
+    pageSize = MemoryAddresses.pageSize
+    data = _make_data()
+    buf = SparseBuffer(data)
+    size = len(data)
+    bounds = [None, 0, 5, 15, pageSize, pageSize * 2 + 5, size - 2, size, -1, -pageSize]
+    for start in bounds:
+        for stop in bounds:
+            for step in (None, 1, 3, -1, -7):
+                key = slice(start, stop, step)
+                assert buf[key] == data[key], key
+    assert isinstance(buf[0:10], bytes)
+    assert buf[size:] == b""
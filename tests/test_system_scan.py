@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the System process snapshot.
+"""
+
+import os
+import subprocess
+import sys
+
+from winappdbg import win32
+from winappdbg.system import System
+
+
+def test_is_admin_cached(monkeypatch):
+    calls = []
+
+    def IsUserAnAdmin():
+        calls.append(None)
+        return True
+
+    monkeypatch.setattr(win32, "IsUserAnAdmin", IsUserAnAdmin)
+    System.is_admin.cache_clear()
+    try:
+        assert System.is_admin() is True
+        assert System.is_admin() is True
+        assert len(calls) == 1
+    finally:
+        System.is_admin.cache_clear()
+
+
+def _spawn_sleeper():
+    return subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+
+def test_scan_processes_drops_dead_processes():
+    child = _spawn_sleeper()
+    try:
+        system = System()
+        system.scan_processes()
+        assert system.has_process(child.pid)
+    finally:
+        child.kill()
+        child.wait()
+    system.scan_processes()
+    assert not system.has_process(child.pid)
+
+
+def test_scan_processes_fast_sees_new_processes():
+    system = System()
+    system.scan_processes_fast()
+    system.scan_processes_fast()
+    child = _spawn_sleeper()
+    try:
+        system.scan_processes_fast()
+        assert system.has_process(child.pid)
+    finally:
+        child.kill()
+        child.wait()
+    system.scan_processes_fast()
+    assert not system.has_process(child.pid)
+
+
+def test_find_processes_by_filename():
+    child = _spawn_sleeper()
+    try:
+        system = System()
+        system.scan_processes()
+        system.scan_process_filenames()
+        fileName = system.get_process(child.pid).get_filename()
+        for name in (os.path.basename(fileName), fileName, fileName.upper()):
+            found = system.find_processes_by_filename(name)
+            assert child.pid in [p.get_pid() for p, _ in found], name
+        base = os.path.splitext(os.path.basename(fileName))[0]
+        found = system.find_processes_by_filename(base)
+        assert child.pid in [p.get_pid() for p, _ in found]
+    finally:
+        child.kill()
+        child.wait()
+
+
+def test_get_pid_from_tid():
+    child = _spawn_sleeper()
+    try:
+        system = System()
+        system.scan_processes_and_threads()
+        dwThreadIds = system.get_process(child.pid).get_thread_ids()
+        assert dwThreadIds
+        for dwThreadId in dwThreadIds:
+            assert system.get_pid_from_tid(dwThreadId) == child.pid
+            assert dwThreadId in system
+    finally:
+        child.kill()
+        child.wait()
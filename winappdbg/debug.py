@@ -1407,7 +1407,9 @@ class Debug(EventDispatcher, _BreakpointContainer):
         :rtype:  bool
         :return: ``True`` to call the user-defined handle, ``False`` otherwise.
         """
-        return event.get_process()._notify_create_thread(event)
+        bCallHandler1 = self.system._notify_create_thread(event)
+        bCallHandler2 = event.get_process()._notify_create_thread(event)
+        return bCallHandler1 and bCallHandler2
 
     def _notify_load_dll(self, event):
         """
@@ -1495,8 +1497,9 @@ class Debug(EventDispatcher, _BreakpointContainer):
         :return: ``True`` to call the user-defined handle, ``False`` otherwise.
         """
         bCallHandler1 = super()._notify_exit_thread(event)
-        bCallHandler2 = event.get_process()._notify_exit_thread(event)
-        return bCallHandler1 and bCallHandler2
+        bCallHandler2 = self.system._notify_exit_thread(event)
+        bCallHandler3 = event.get_process()._notify_exit_thread(event)
+        return bCallHandler1 and bCallHandler2 and bCallHandler3
 
     def _notify_unload_dll(self, event):
         """
@@ -2183,7 +2183,7 @@ class ConsoleDebugger(Cmd, EventHandler):
         process = self.get_process_from_prefix()
         try:
             memoryMap = process.get_memory_map()
-            mappedFilenames = process.get_mapped_filenames()
+            mappedFilenames = process.get_mapped_filenames(memoryMap)
             print()
             print(CrashDump.dump_memory_map(memoryMap, mappedFilenames))
         except WindowsError:
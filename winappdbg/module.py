@@ -144,6 +144,7 @@ class Module:
         self.EntryPoint = EntryPoint
 
         self.__symbols = None
+        self.__exports = dict()
 
         self.set_handle(hFile)
         self.set_process(process)
@@ -763,6 +764,13 @@ class Module:
         :rtype:  int
         """
 
+        # Exports don't change while the module is loaded,
+        # so reuse the address if we've already resolved it.
+        try:
+            return self.__exports[function]
+        except KeyError:
+            pass
+
         # Unknown DLL filename, there's nothing we can do.
         filename = self.get_filename()
         if not filename:
@@ -788,7 +796,9 @@ class Module:
             return None
 
         # Compensate for DLL base relocations locally and remotely.
-        return address - hlib + self.lpBaseOfDll
+        address = address - hlib + self.lpBaseOfDll
+        self.__exports[function] = address
+        return address
 
     def resolve_label(self, label):
         """
@@ -43,11 +43,17 @@ This module contains the logic for handling process lifetime, memory, etc.
 __all__ = ["Process"]
 
 import ctypes
+import functools
+import itertools
 import ntpath
 import re
 import struct
+import sys
+import threading
 import traceback
 import warnings
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from os import getenv
 
 from . import win32
@@ -57,12 +63,194 @@ from .module import _ModuleContainer
 from .search import HexPattern, IStringPattern, Pattern, Search, StringPattern
 from .textio import HexDump, HexInput
 from .thread import Thread, _ThreadContainer
-from .util import MemoryAddresses, PathOperations, Regenerator
+from .util import MemoryAddresses, PathOperations, Regenerator, SparseBuffer
 from .window import Window
 
 # delayed import
 System = None
 
+# Maximum number of bytes read ahead when iterating a memory snapshot, and
+# number of threads doing the reading. Snapshots that aren't any bigger than
+# that are read inline, without starting any threads.
+_SNAPSHOT_READ_AHEAD = 4 * 1024 * 1024
+_SNAPSHOT_READ_WORKERS = 8
+
+# Maximum number of processes whose modules or filenames are scanned at the
+# same time.
+_SCAN_WORKERS = 32
+
+# Precompiled packers for 32 bit little endian integers.
+_PACK_U32 = struct.Struct("<L").pack
+_PACK_U32_INTO = struct.Struct("<L").pack_into
+
+# Remote page shared by the library names written by Process.inject_dll(),
+# split in slots big enough for a MAX_PATH library name in Unicode. Longer
+# names take as many consecutive slots as they need, up to the whole page.
+_INJECT_POOL_PAGE = 0x1000
+_INJECT_POOL_SLOT = 0x400
+
+
+# Used by Process.inject_dll() to find room in its remote buffer pool.
+# Returns the index of the first of count consecutive free slots, or None.
+def _find_free_slots(slots, count):
+    run = 0
+    for index, owner in enumerate(slots):
+        if owner is None:
+            run += 1
+            if run == count:
+                return index - count + 1
+        else:
+            run = 0
+    return None
+
+
+# Used by Process.inject_dll() to build the i386 shellcode.
+# Only the library and procedure names and the parameter change from one call
+# to the next, so the rest of the code is built once as a template for each
+# set of resolved API addresses. Returns the template and the offsets where
+# the library name, the procedure name and the parameter go. The names are
+# inserted right after their "call" instructions, whose operand is the length.
+@functools.lru_cache(maxsize=16)
+def _inject_dll_shellcode(pllib, pgpad, pvf, bWait):
+    code = bytearray()
+
+    # push ebp      ; only when returning instead of freeing ourselves
+    if bWait:
+        code += b"\x55"
+
+    # push dllname
+    code += b"\xe8\x00\x00\x00\x00"
+    dllname_at = len(code)
+
+    # mov eax, LoadLibraryA
+    # call eax
+    code += b"\xb8" + _PACK_U32(pllib) + b"\xff\xd0"
+
+    # push procname
+    code += b"\xe8\x00\x00\x00\x00"
+    procname_at = len(code)
+
+    # push eax
+    # mov eax, GetProcAddress
+    # call eax
+    # mov ebp, esp      ; preserve stack pointer
+    # push lpParameter
+    code += b"\x50" + b"\xb8" + _PACK_U32(pgpad) + b"\xff\xd0"
+    code += b"\x8b\xec" + b"\x68"
+    param_at = len(code)
+    code += b"\x00\x00\x00\x00"
+
+    # call eax
+    # mov esp, ebp      ; restore stack pointer
+    code += b"\xff\xd0" + b"\x8b\xe5"
+
+    # If the caller waits for the thread, just return and let the memory be
+    # freed from there. Otherwise free the shellcode memory and return.
+    if bWait:
+        # pop ebp
+        # ret 4
+        code += b"\x5d\xc2\x04\x00"
+    else:
+        # pop edx       ; our own return address
+        # push MEM_RELEASE  ; dwFreeType
+        # push 0x1000       ; dwSize, shellcode max size 4096 bytes
+        # call $+5
+        # and dword ptr [esp], 0xFFFFF000   ; align to page boundary
+        # mov eax, VirtualFree
+        # push edx      ; our own return address
+        # jmp eax   ; VirtualFree will return to our own return address
+        code += b"\x5a"
+        code += b"\x68" + _PACK_U32(win32.MEM_RELEASE)
+        code += b"\x68" + _PACK_U32(0x1000)
+        code += b"\xe8\x00\x00\x00\x00"
+        code += b"\x81\x24\x24\x00\xf0\xff\xff"
+        code += b"\xb8" + _PACK_U32(pvf)
+        code += b"\x52"
+        code += b"\xff\xe0"
+
+    return bytes(code), dllname_at, procname_at, param_at
+
+
+# Used by Process.inject_dll() to convert DLL names to null terminated strings.
+# The same DLL is usually injected into many processes, so cache the results.
+@functools.lru_cache(maxsize=64)
+def _dllname_to_ansi(dllname):
+    if isinstance(dllname, str):
+        dllname = dllname.encode("ascii")
+    return dllname + b"\0"
+
+
+@functools.lru_cache(maxsize=64)
+def _dllname_to_unicode(dllname):
+    return dllname.encode("utf-16le") + b"\0\0"
+
+
+# Used by _ProcessContainer.argv_to_cmdline() to find the arguments that must
+# be quoted, with a single scan of each argument.
+_NEEDS_QUOTES = re.compile(r"[ \t\n\r]").search
+
+# Used by _ProcessContainer.argv_to_cmdline() to let plain arguments through
+# untouched, which is the common case.
+_NEEDS_ESCAPING = re.compile(r'[ \t\n\r"]').search
+
+
+# Used by _ProcessContainer.get_explorer_pid() to find "explorer.exe".
+# The Windows directory doesn't change, so it's only looked up once.
+@functools.lru_cache(maxsize=1)
+def _get_explorer_pathname():
+    try:
+        exp = win32.SHGetFolderPath(win32.CSIDL_WINDOWS)
+    except Exception:
+        exp = None
+    if not exp:
+        exp = getenv("SystemRoot")
+    if exp:
+        return ntpath.join(exp, "explorer.exe")
+    return None
+
+
+# Used by _ProcessContainer.scan_processes_and_threads() to walk a Toolhelp
+# snapshot. A single entry structure is reused for the whole walk, and only
+# the fields we need are copied out of it, as plain tuples. Filenames are
+# interned, since many processes usually share the same one.
+def _iter_process32(hSnapshot):
+    pe = win32.Process32First(hSnapshot)
+    while pe is not None:
+        fileName = pe.szExeFile
+        if isinstance(fileName, bytes):
+            fileName = fileName.decode("mbcs", "ignore")
+        fileName = sys.intern(fileName)
+        yield pe.th32ProcessID, fileName
+        pe = win32.Process32Next(hSnapshot, pe)
+
+
+def _iter_thread32(hSnapshot):
+    te = win32.Thread32First(hSnapshot)
+    while te is not None:
+        yield te.th32ThreadID, te.th32OwnerProcessID
+        te = win32.Thread32Next(hSnapshot, te)
+
+
+# Used by _ProcessContainer.scan_processes_fast() to walk the process list
+# returned by NtQuerySystemInformation. The image names are only the filename
+# without the path, and the idle process has none.
+def _iter_system_processes(SystemInformation):
+    SYSTEM_PROCESS_INFORMATION = win32.SYSTEM_PROCESS_INFORMATION
+    offset = 0
+    while True:
+        spi = SYSTEM_PROCESS_INFORMATION.from_buffer(SystemInformation, offset)
+        ImageName = spi.ImageName
+        if ImageName.Buffer:
+            fileName = ctypes.wstring_at(ImageName.Buffer, ImageName.Length // 2)
+            fileName = sys.intern(fileName)
+        else:
+            fileName = None
+        yield spi.UniqueProcessId, fileName
+        if not spi.NextEntryOffset:
+            break
+        offset += spi.NextEntryOffset
+
+
 # ==============================================================================
 
 # TODO
@@ -101,6 +289,26 @@ class Process(_ThreadContainer, _ModuleContainer):
         self.hProcess = hProcess
         self.fileName = fileName
 
+        # Scratch buffer reused by iter_memory_map() on each query.
+        self._mbi_scratch = win32.MEMORY_BASIC_INFORMATION()
+
+        # Remote buffer pool used by inject_dll(), allocated on demand.
+        # Each slot is None when free, True while in use, or the loader
+        # Thread that timed out while still using it.
+        self.__inject_pool = None
+        self.__inject_pool_slots = []
+        self.__inject_pool_lock = threading.Lock()
+
+        # kernel32.dll module, found on demand by inject_dll().
+        self.__kernel32 = None
+
+        # Address of kernel32!ExitProcess, resolved on demand by clean_exit().
+        self.__pExitProcess = None
+
+        # Last scan of _ProcessContainer.scan_processes_and_threads() in which
+        # this process was seen alive.
+        self._seen_gen = 0
+
     def get_pid(self):
         """
         :rtype:  int
@@ -159,6 +367,12 @@ class Process(_ThreadContainer, _ModuleContainer):
             collector claims them. So unless you've been tinkering with it,
             setting :attr:`hProcess` to ``None`` should be enough.
         """
+        try:
+            self.__free_inject_pool()
+        except Exception:
+            warnings.warn(
+                "Failed to free inject_dll() buffers: %s" % traceback.format_exc()
+            )
         try:
             if hasattr(self.hProcess, "close"):
                 self.hProcess.close()
@@ -418,6 +632,8 @@ class Process(_ThreadContainer, _ModuleContainer):
         Clears the snapshot of threads and modules.
         """
         try:
+            self.__kernel32 = None
+            self.__pExitProcess = None
             try:
                 self.clear_threads()
             finally:
@@ -667,6 +883,22 @@ class Process(_ThreadContainer, _ModuleContainer):
             - x64 processes running under emulation
             - x86 processes running under emulation
         """
+        try:
+            arch = self.__arch
+        except AttributeError:
+            # The architecture can't change, so it's only queried once.
+            arch = self.__arch = self.__query_arch()
+        return arch
+
+    def __query_arch(self):
+        """
+        Queries the architecture in which this process believes to be running.
+
+        Used internally by :meth:`get_arch`.
+
+        :rtype:  str
+        :return: Architecture of the process.
+        """
 
         # Try to use the newer GetProcessInformation API first (Windows 8+).
         # This is the most accurate method and works correctly on ARM64 systems.
@@ -2210,6 +2442,33 @@ class Process(_ThreadContainer, _ModuleContainer):
         hProcess = self.get_handle(win32.PROCESS_VM_OPERATION)
         return win32.VirtualAllocEx(hProcess, lpAddress, dwSize)
 
+    def malloc_and_write(self, lpBuffer):
+        """
+        Allocates memory into the address space of the process and writes
+        the given data to it.
+
+        This is faster than calling :meth:`malloc` and then :meth:`write`,
+        since the newly allocated memory is known to be writeable and
+        doesn't need to be queried first.
+
+        .. seealso:: :meth:`free`
+
+        :param bytes lpBuffer: Bytes to write.
+        :rtype: int
+        :return: Address of the newly allocated memory.
+        :raises WindowsError: On error an exception is raised.
+        """
+        hProcess = self.get_handle(win32.PROCESS_VM_OPERATION | win32.PROCESS_VM_WRITE)
+        lpAddress = win32.VirtualAllocEx(hProcess, None, len(lpBuffer))
+        try:
+            r = win32.WriteProcessMemory(hProcess, lpAddress, lpBuffer)
+            if r != len(lpBuffer):
+                raise ctypes.WinError()
+        except Exception:
+            win32.VirtualFreeEx(hProcess, lpAddress)
+            raise
+        return lpAddress
+
     def mprotect(self, lpAddress, dwSize, flNewProtect):
         """
         Set memory protection in the address space of the process.
@@ -2496,38 +2755,64 @@ class Process(_ThreadContainer, _ModuleContainer):
             raise
         return mbi.is_executable_and_writeable()
 
-    def is_buffer(self, address, size):
+    def __check_buffer(self, address, size, predicate):
         """
-        Determines if the given memory area is a valid code or data buffer.
-
-        .. note::
+        Used internally by the ``is_buffer_*`` methods.
 
-            Returns always ``False`` for kernel mode addresses.
-
-        .. seealso:: :meth:`mquery`
+        Walks the memory regions overlapping the given buffer and checks each
+        one against the given predicate. The process handle is only fetched
+        once, and the walk stops at the first region that fails the check.
 
         :param int address: Memory address.
         :param int size: Number of bytes. Must be greater than zero.
+        :param callable predicate: Unbound
+            :class:`~win32.MemoryBasicInformation` method to call on each
+            memory region.
         :rtype: bool
-        :return: ``True`` if the memory area is a valid code or data buffer,
+        :return: ``True`` if all the regions pass the check,
             ``False`` otherwise.
         :raises ValueError: The size argument must be greater than zero.
         :raises WindowsError: On error an exception is raised.
         """
         if size <= 0:
             raise ValueError("The size argument must be greater than zero")
-        while size > 0:
+        hProcess = self.get_handle(win32.PROCESS_QUERY_INFORMATION)
+        NtQueryVirtualMemory = win32.NtQueryVirtualMemory
+        end = address + size
+        while address < end:
             try:
-                mbi = self.mquery(address)
+                mbi = NtQueryVirtualMemory(hProcess, address)
             except WindowsError as e:
                 if e.winerror == win32.ERROR_INVALID_PARAMETER:
                     return False
                 raise
-            if not mbi.has_content():
+            if not predicate(mbi):
                 return False
-            size = size - mbi.RegionSize
+            address = mbi.BaseAddress + mbi.RegionSize
         return True
 
+    def is_buffer(self, address, size):
+        """
+        Determines if the given memory area is a valid code or data buffer.
+
+        .. note::
+
+            Returns always ``False`` for kernel mode addresses.
+
+        .. seealso:: :meth:`mquery`
+
+        :param int address: Memory address.
+        :param int size: Number of bytes. Must be greater than zero.
+        :rtype: bool
+        :return: ``True`` if the memory area is a valid code or data buffer,
+            ``False`` otherwise.
+        :raises ValueError: The size argument must be greater than zero.
+        :raises WindowsError: On error an exception is raised.
+        """
+        return self.__check_buffer(
+            address, size, win32.MemoryBasicInformation.has_content
+        )
+
     def is_buffer_readable(self, address, size):
         """
         Determines if the given memory area is readable.
@@ -2545,19 +2830,9 @@ class Process(_ThreadContainer, _ModuleContainer):
         :raises ValueError: The size argument must be greater than zero.
         :raises WindowsError: On error an exception is raised.
         """
-        if size <= 0:
-            raise ValueError("The size argument must be greater than zero")
-        while size > 0:
-            try:
-                mbi = self.mquery(address)
-            except WindowsError as e:
-                if e.winerror == win32.ERROR_INVALID_PARAMETER:
-                    return False
-                raise
-            if not mbi.is_readable():
-                return False
-            size = size - mbi.RegionSize
-        return True
+        return self.__check_buffer(
+            address, size, win32.MemoryBasicInformation.is_readable
+        )
 
     def is_buffer_writeable(self, address, size):
         """
@@ -2576,19 +2851,9 @@ class Process(_ThreadContainer, _ModuleContainer):
         :raises ValueError: The size argument must be greater than zero.
         :raises WindowsError: On error an exception is raised.
         """
-        if size <= 0:
-            raise ValueError("The size argument must be greater than zero")
-        while size > 0:
-            try:
-                mbi = self.mquery(address)
-            except WindowsError as e:
-                if e.winerror == win32.ERROR_INVALID_PARAMETER:
-                    return False
-                raise
-            if not mbi.is_writeable():
-                return False
-            size = size - mbi.RegionSize
-        return True
+        return self.__check_buffer(
+            address, size, win32.MemoryBasicInformation.is_writeable
+        )
 
     def is_buffer_copy_on_write(self, address, size):
         """
@@ -2608,19 +2873,9 @@ class Process(_ThreadContainer, _ModuleContainer):
         :raises ValueError: The size argument must be greater than zero.
         :raises WindowsError: On error an exception is raised.
         """
-        if size <= 0:
-            raise ValueError("The size argument must be greater than zero")
-        while size > 0:
-            try:
-                mbi = self.mquery(address)
-            except WindowsError as e:
-                if e.winerror == win32.ERROR_INVALID_PARAMETER:
-                    return False
-                raise
-            if not mbi.is_copy_on_write():
-                return False
-            size = size - mbi.RegionSize
-        return True
+        return self.__check_buffer(
+            address, size, win32.MemoryBasicInformation.is_copy_on_write
+        )
 
     def is_buffer_executable(self, address, size):
         """
@@ -2639,19 +2894,9 @@ class Process(_ThreadContainer, _ModuleContainer):
         :raises ValueError: The size argument must be greater than zero.
         :raises WindowsError: On error an exception is raised.
         """
-        if size <= 0:
-            raise ValueError("The size argument must be greater than zero")
-        while size > 0:
-            try:
-                mbi = self.mquery(address)
-            except WindowsError as e:
-                if e.winerror == win32.ERROR_INVALID_PARAMETER:
-                    return False
-                raise
-            if not mbi.is_executable():
-                return False
-            size = size - mbi.RegionSize
-        return True
+        return self.__check_buffer(
+            address, size, win32.MemoryBasicInformation.is_executable
+        )
 
     def is_buffer_executable_and_writeable(self, address, size):
         """
@@ -2674,19 +2919,9 @@ class Process(_ThreadContainer, _ModuleContainer):
         :raises ValueError: The size argument must be greater than zero.
         :raises WindowsError: On error an exception is raised.
         """
-        if size <= 0:
-            raise ValueError("The size argument must be greater than zero")
-        while size > 0:
-            try:
-                mbi = self.mquery(address)
-            except WindowsError as e:
-                if e.winerror == win32.ERROR_INVALID_PARAMETER:
-                    return False
-                raise
-            if not mbi.is_executable():
-                return False
-            size = size - mbi.RegionSize
-        return True
+        return self.__check_buffer(
+            address, size, win32.MemoryBasicInformation.is_executable_and_writeable
+        )
 
     def get_memory_map(self, minAddr=None, maxAddr=None):
         """
@@ -2733,11 +2968,14 @@ class Process(_ThreadContainer, _ModuleContainer):
         :return: List of memory region information objects.
         """
         minAddr, maxAddr = MemoryAddresses.align_address_range(minAddr, maxAddr)
+        lpBuffer = self._mbi_scratch
         prevAddr = minAddr - 1
         currentAddr = minAddr
         while prevAddr < currentAddr < maxAddr:
+            # The handle may be reopened by the caller between iterations.
+            hProcess = self.get_handle(win32.PROCESS_QUERY_INFORMATION)
             try:
-                mbi = self.mquery(currentAddr)
+                mbi = win32.NtQueryVirtualMemory(hProcess, currentAddr, 0, lpBuffer)
             except WindowsError as e:
                 if e.winerror == win32.ERROR_INVALID_PARAMETER:
                     break
@@ -2750,9 +2988,11 @@ class Process(_ThreadContainer, _ModuleContainer):
         """
         Retrieves the filenames for memory mapped files in the debugee.
 
-        :param list[win32.MemoryBasicInformation] memoryMap:
-            Optional. Memory map returned by :meth:`get_memory_map`.
-            If not given, the current memory map is used.
+        :param iterable[win32.MemoryBasicInformation] memoryMap:
+            Optional. Memory map returned by :meth:`get_memory_map`, or any
+            iterable of memory region information objects, such as the one
+            returned by :meth:`iter_memory_map`.
+            If not given, the current memory map is iterated.
         :rtype: dict[int, str]
         :return: Dictionary mapping memory addresses to file names.
             Native filenames are converted to Win32 filenames when possible.
@@ -2760,29 +3000,36 @@ class Process(_ThreadContainer, _ModuleContainer):
         hProcess = self.get_handle(
             win32.PROCESS_VM_READ | win32.PROCESS_QUERY_INFORMATION
         )
-        if not memoryMap:
-            memoryMap = self.get_memory_map()
+        if memoryMap is None:
+            memoryMap = self.iter_memory_map()
         mappedFilenames = dict()
         for mbi in memoryMap:
-            if mbi.Type not in (win32.MEM_IMAGE, win32.MEM_MAPPED):
-                continue
-            baseAddress = mbi.BaseAddress
-            fileName = ""
-            try:
-                fileName = win32.GetMappedFileName(hProcess, baseAddress)
-                fileName = PathOperations.native_to_win32_pathname(fileName)
-            except WindowsError as e:  # NOQA
-                # try:
-                #    msg = "Can't get mapped file name at address %s in process " \
-                #          "%d, reason: %s" % (HexDump.address(baseAddress),
-                #                              self.get_pid(),
-                #                              e.strerror)
-                #    warnings.warn(msg, Warning)
-                # except Exception:
-                pass
-            mappedFilenames[baseAddress] = fileName
+            if mbi.Type in (win32.MEM_IMAGE, win32.MEM_MAPPED):
+                mappedFilenames[mbi.BaseAddress] = self.__get_mapped_filename(
+                    hProcess, mbi.BaseAddress
+                )
         return mappedFilenames
 
+    def __get_mapped_filename(self, hProcess, baseAddress):
+        """
+        Used internally by :meth:`get_mapped_filenames` and
+        :meth:`iter_memory_snapshot`.
+        """
+        fileName = ""
+        try:
+            fileName = win32.GetMappedFileName(hProcess, baseAddress)
+            fileName = PathOperations.native_to_win32_pathname(fileName)
+        except WindowsError as e:  # NOQA
+            # try:
+            #    msg = "Can't get mapped file name at address %s in process " \
+            #          "%d, reason: %s" % (HexDump.address(baseAddress),
+            #                              self.get_pid(),
+            #                              e.strerror)
+            #    warnings.warn(msg, Warning)
+            # except Exception:
+            pass
+        return fileName
+
     def generate_memory_snapshot(self, minAddr=None, maxAddr=None):
         """
         Returns a :class:`Regenerator` that allows you to iterate through the memory
@@ -2867,6 +3114,17 @@ class Process(_ThreadContainer, _ModuleContainer):
             - ``filename``: Mapped filename, or ``None``.
             - ``content``: Memory contents, or ``None``.
         """
+        return self.__iter_memory_snapshot(minAddr, maxAddr)
+
+    def __iter_memory_snapshot(self, minAddr=None, maxAddr=None, previous=None):
+        """
+        Used internally by :meth:`iter_memory_snapshot` and
+        :meth:`take_incremental_memory_snapshot`.
+
+        :param dict[int, win32.MemoryBasicInformation] previous:
+            Optional. Regions of a previous snapshot, indexed by address.
+            Their contents are reused when they can't have changed.
+        """
 
         # One may feel tempted to include calls to self.suspend() and
         # self.resume() here, but that wouldn't work on a dead process.
@@ -2881,15 +3139,6 @@ class Process(_ThreadContainer, _ModuleContainer):
         if not memory:
             return
 
-        # Get the mapped filenames.
-        # Don't fail on access denied errors.
-        try:
-            filenames = self.get_mapped_filenames(memory)
-        except WindowsError as e:
-            if e.winerror != win32.ERROR_ACCESS_DENIED:
-                raise
-            filenames = dict()
-
         # Trim the first memory information block if needed.
         if minAddr is not None:
             minAddr = MemoryAddresses.align_address_to_page_start(minAddr)
@@ -2906,17 +3155,95 @@ class Process(_ThreadContainer, _ModuleContainer):
             if mbi.BaseAddress + mbi.RegionSize > maxAddr:
                 mbi.RegionSize = maxAddr - mbi.BaseAddress
 
-        # Read the contents of each block and yield it.
-        while memory:
-            mbi = memory.pop(0)  # so the garbage collector can take it
-            mbi.filename = filenames.get(mbi.BaseAddress, None)
-            if mbi.has_content():
-                mbi.content = self.read(mbi.BaseAddress, mbi.RegionSize)
-            else:
-                mbi.content = None
-            yield mbi
+        # Make sure we have a handle with enough access rights before any
+        # reads are issued, so the worker threads never need to reopen it.
+        hProcess = self.get_handle(
+            win32.PROCESS_VM_READ | win32.PROCESS_QUERY_INFORMATION
+        )
 
-    def take_memory_snapshot(self, minAddr=None, maxAddr=None):
+        # Get the mapped filename and read the contents of each block,
+        # then yield it. This is done in a single pass over the memory map.
+        # ReadProcessMemory releases the GIL, so when there's enough to read
+        # the next few blocks are read ahead in a thread pool, while the
+        # block at the front of the queue is read inline. Only a bounded
+        # number of bytes is read ahead, to keep the memory usage under
+        # control. Both queues are deques so popping from the front is O(1).
+        bReadAhead = (
+            sum(mbi.RegionSize for mbi in memory if mbi.has_content())
+            > _SNAPSHOT_READ_AHEAD
+        )
+        memory = deque(memory)
+        read = self.read
+        pending = deque()
+        executor = None
+        dwPending = 0  # bytes being read ahead
+        try:
+            while memory or pending:
+                while memory and dwPending < _SNAPSHOT_READ_AHEAD:
+                    mbi = memory.popleft()  # so the garbage collector can take it
+                    if mbi.Type in (win32.MEM_IMAGE, win32.MEM_MAPPED):
+                        mbi.filename = self.__get_mapped_filename(
+                            hProcess, mbi.BaseAddress
+                        )
+                    else:
+                        mbi.filename = None
+                    mbi.content = None
+                    bRead = False
+                    future = None
+                    if mbi.has_content():
+                        if previous:
+                            mbi.content = self.__get_unchanged_content(
+                                mbi, previous.get(mbi.BaseAddress)
+                            )
+                        if mbi.content is None:
+                            bRead = True
+                            if bReadAhead and pending:
+                                if executor is None:
+                                    executor = ThreadPoolExecutor(
+                                        max_workers=_SNAPSHOT_READ_WORKERS
+                                    )
+                                future = executor.submit(
+                                    read, mbi.BaseAddress, mbi.RegionSize
+                                )
+                                dwPending += mbi.RegionSize
+                    pending.append((mbi, bRead, future))
+                    if not bReadAhead and bRead:
+                        break
+                mbi, bRead, future = pending.popleft()
+                if future is not None:
+                    mbi.content = future.result()
+                    dwPending -= mbi.RegionSize
+                elif bRead:
+                    mbi.content = read(mbi.BaseAddress, mbi.RegionSize)
+                yield mbi
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    @staticmethod
+    def __get_unchanged_content(mbi, old_mbi):
+        """
+        Used internally by :meth:`__iter_memory_snapshot`.
+
+        Returns the contents of a memory region from a previous snapshot,
+        if the region is still there with the same size, state, type and
+        protection, and is not writeable. Otherwise returns ``None``.
+        """
+        if (
+            old_mbi is None
+            or mbi.is_writeable()
+            or old_mbi.RegionSize != mbi.RegionSize
+            or old_mbi.State != mbi.State
+            or old_mbi.Protect != mbi.Protect
+            or old_mbi.Type != mbi.Type
+        ):
+            return None
+        content = getattr(old_mbi, "content", None)
+        if content is None or len(content) != mbi.RegionSize:
+            return None
+        return content
+
+    def take_memory_snapshot(self, minAddr=None, maxAddr=None, bSparse=False):
         """
         Takes a snapshot of the memory contents of the process.
 
@@ -2945,6 +3272,52 @@ class Process(_ThreadContainer, _ModuleContainer):
 
         .. seealso:: :meth:`generate_memory_snapshot`
 
+        :param int minAddr: Optional. Starting address in address range to query.
+        :param int maxAddr: Optional. Ending address in address range to query.
+        :param bool bSparse: ``True`` to store the memory contents as
+            :class:`~winappdbg.util.SparseBuffer` objects, which don't keep
+            the pages filled with zeros. This greatly reduces the size of
+            the snapshot, but the contents must be converted with
+            ``bytes()`` before use. ``False`` to store them as ``bytes``.
+        :rtype: list[win32.MemoryBasicInformation]
+        :return: List of memory region information objects.
+            Two extra properties are added to these objects:
+
+            - ``filename``: Mapped filename, or ``None``.
+            - ``content``: Memory contents, or ``None``.
+        """
+        if not bSparse:
+            return list(self.iter_memory_snapshot(minAddr, maxAddr))
+        snapshot = []
+        for mbi in self.iter_memory_snapshot(minAddr, maxAddr):
+            if mbi.content:
+                mbi.content = SparseBuffer(mbi.content)
+            snapshot.append(mbi)
+        return snapshot
+
+    def take_incremental_memory_snapshot(self, snapshot, minAddr=None, maxAddr=None):
+        """
+        Takes a new snapshot of the memory contents of the process, reusing
+        the contents of a previous snapshot where possible.
+
+        Regions that are not writeable, and whose address, size, state, type
+        and protection haven't changed since the previous snapshot, keep
+        their previous contents instead of being read again. This is much
+        faster when taking frequent snapshots, since most of the address
+        space of a typical process is read-only code and data.
+
+        .. warning::
+
+            Memory written by a debugger (for example with :meth:`poke`,
+            which temporarily changes the page permissions) or through a
+            different view of a shared mapped file is not detected. Use
+            :meth:`take_memory_snapshot` if that matters to you.
+
+        .. seealso:: :meth:`take_memory_snapshot`
+
+        :param list[win32.MemoryBasicInformation] snapshot:
+            Memory snapshot returned by :meth:`take_memory_snapshot` or by
+            this method.
         :param int minAddr: Optional. Starting address in address range to query.
         :param int maxAddr: Optional. Ending address in address range to query.
         :rtype: list[win32.MemoryBasicInformation]
@@ -2954,7 +3327,8 @@ class Process(_ThreadContainer, _ModuleContainer):
             - ``filename``: Mapped filename, or ``None``.
             - ``content``: Memory contents, or ``None``.
         """
-        return list(self.iter_memory_snapshot(minAddr, maxAddr))
+        previous = {mbi.BaseAddress: mbi for mbi in snapshot}
+        return list(self.__iter_memory_snapshot(minAddr, maxAddr, previous))
 
     def restore_memory_snapshot(
         self, snapshot, bSkipMappedFiles=True, bSkipOnError=False
@@ -3000,7 +3374,8 @@ class Process(_ThreadContainer, _ModuleContainer):
 
         # Get the process handle.
         hProcess = self.get_handle(
-            win32.PROCESS_VM_WRITE
+            win32.PROCESS_VM_READ
+            | win32.PROCESS_VM_WRITE
             | win32.PROCESS_VM_OPERATION
             | win32.PROCESS_SUSPEND_RESUME
             | win32.PROCESS_QUERY_INFORMATION
@@ -3160,14 +3535,16 @@ class Process(_ThreadContainer, _ModuleContainer):
                 )
                 new_mbi.Protect = old_mbi.Protect
 
-            # Restore the region data.
+            # Restore the region data, unless it hasn't changed.
             # Ignore write errors when the region belongs to a mapped file.
             if old_mbi.has_content():
-                if old_mbi.Type != 0:
-                    if not bSkipMappedFiles:
-                        self.poke(old_mbi.BaseAddress, old_mbi.content)
-                else:
-                    self.write(old_mbi.BaseAddress, old_mbi.content)
+                if not self.__is_content_unchanged(hProcess, old_mbi):
+                    content = bytes(old_mbi.content)  # may be a SparseBuffer
+                    if old_mbi.Type != 0:
+                        if not bSkipMappedFiles:
+                            self.poke(old_mbi.BaseAddress, content)
+                    else:
+                        self.write(old_mbi.BaseAddress, content)
                 new_mbi.content = old_mbi.content
 
         # On error, skip this region or raise an exception.
@@ -3181,6 +3558,37 @@ class Process(_ThreadContainer, _ModuleContainer):
             )
             warnings.warn(msg, RuntimeWarning)
 
+    def __is_content_unchanged(self, hProcess, mbi):
+        """
+        Used internally by :meth:`__restore_mbi`.
+
+        Compares the snapshot contents of a memory region against the current
+        contents, so unchanged regions don't have to be written back.
+
+        The first and last pages are compared first, so most regions that
+        did change are told apart without reading them in full.
+        """
+        if not mbi.is_readable():
+            return False
+        lpAddress = mbi.BaseAddress
+        dwSize = mbi.RegionSize
+        content = mbi.content
+        pageSize = MemoryAddresses.pageSize
+        try:
+            if dwSize <= pageSize * 2:
+                data = win32.ReadProcessMemory(hProcess, lpAddress, dwSize)
+                return data == content
+            for offset in (0, dwSize - pageSize):
+                data = win32.ReadProcessMemory(hProcess, lpAddress + offset, pageSize)
+                if data != content[offset : offset + pageSize]:
+                    return False
+            data = win32.ReadProcessMemory(
+                hProcess, lpAddress + pageSize, dwSize - pageSize * 2
+            )
+        except WindowsError:
+            return False
+        return data == content[pageSize : dwSize - pageSize]
+
     # ------------------------------------------------------------------------------
 
     def inject_code(self, payload, lpParameter=0):
@@ -3192,6 +3600,11 @@ class Process(_ThreadContainer, _ModuleContainer):
             Don't forget to free the memory when you're done with it!
             Otherwise you'll be leaking memory in the target process.
 
+        .. note::
+
+            The payload is copied into the process with a single allocation
+            and a single write, so pass it already assembled in one piece.
+
         .. seealso:: :meth:`inject_dll`
 
         :param str payload: Relocatable code to run in a new thread.
@@ -3207,14 +3620,11 @@ class Process(_ThreadContainer, _ModuleContainer):
         # Uncomment for debugging...
         ##        payload = '\xCC' + payload
 
-        # Allocate the memory for the shellcode.
-        lpStartAddress = self.malloc(len(payload))
+        # Allocate the memory for the shellcode and write it there.
+        lpStartAddress = self.malloc_and_write(payload)
 
         # Catch exceptions so we can free the memory on error.
         try:
-            # Write the shellcode to our memory location.
-            self.write(lpStartAddress, payload)
-
             # Start a new thread for the shellcode to run.
             aThread = self.start_thread(lpStartAddress, lpParameter, bSuspended=False)
 
@@ -3233,6 +3643,150 @@ class Process(_ThreadContainer, _ModuleContainer):
         # Return the Thread object and the shellcode address.
         return aThread, lpStartAddress
 
+    def __get_kernel32_module(self):
+        """
+        Finds the kernel32.dll module in the process, rescanning the modules
+        only if it's not in the current snapshot. The result is kept until
+        :meth:`clear` is called, since kernel32.dll can't be unloaded.
+
+        Used internally by :meth:`inject_dll`.
+
+        :rtype: Module
+        :return: kernel32.dll module.
+        :raises RuntimeError: The module could not be found.
+        """
+        aModule = self.__kernel32
+        if aModule is None:
+            aModule = self.get_module_by_name("kernel32.dll")
+            if aModule is None:
+                self.scan_modules()
+                aModule = self.get_module_by_name("kernel32.dll")
+            if aModule is None:
+                raise RuntimeError("Cannot resolve kernel32.dll in the remote process")
+            self.__kernel32 = aModule
+        return aModule
+
+    @staticmethod
+    def __has_exited(aThread):
+        """
+        Tells if a thread is known to have finished running.
+
+        Used internally by the remote buffer pool of :meth:`inject_dll`.
+
+        :param Thread aThread: Thread object.
+        :rtype: bool
+        :return: ``True`` if the thread finished, ``False`` if it's still
+            running or it could not be determined.
+        """
+        try:
+            aThread.wait(0)
+        except WindowsError:
+            return False
+        return True
+
+    def __inject_pool_alloc(self, lpBuffer):
+        """
+        Copies a short buffer into free slots of the remote buffer pool,
+        allocating the pool page the first time it's needed. The page is
+        readable and writeable, but not executable. The buffer size is
+        rounded up to a whole number of slots.
+
+        Used internally by :meth:`inject_dll`.
+
+        :param bytes lpBuffer: Bytes to write.
+        :rtype: int or None
+        :return: Address of the first slot, or ``None`` if the buffer is
+            bigger than the pool page or there are not enough free slots left.
+        :raises WindowsError: On error an exception is raised.
+        """
+        if len(lpBuffer) > _INJECT_POOL_PAGE:
+            return None
+        count = max(1, -(-len(lpBuffer) // _INJECT_POOL_SLOT))
+
+        # Get the handle before taking the lock, since upgrading its access
+        # rights closes the old handle, and that may free the pool page.
+        hProcess = self.get_handle(win32.PROCESS_VM_OPERATION | win32.PROCESS_VM_WRITE)
+        with self.__inject_pool_lock:
+            if self.__inject_pool is None:
+                self.__inject_pool = win32.VirtualAllocEx(
+                    hProcess,
+                    None,
+                    _INJECT_POOL_PAGE,
+                    win32.MEM_COMMIT | win32.MEM_RESERVE,
+                    win32.PAGE_READWRITE,
+                )
+                self.__inject_pool_slots = [None] * (
+                    _INJECT_POOL_PAGE // _INJECT_POOL_SLOT
+                )
+            slots = self.__inject_pool_slots
+
+            # Slots retired by a timeout come back once their thread is gone.
+            start = _find_free_slots(slots, count)
+            if start is None:
+                for index, owner in enumerate(slots):
+                    if (
+                        owner is not None
+                        and owner is not True
+                        and self.__has_exited(owner)
+                    ):
+                        slots[index] = None
+                start = _find_free_slots(slots, count)
+                if start is None:
+                    return None
+            slots[start : start + count] = [True] * count
+            lpAddress = self.__inject_pool + start * _INJECT_POOL_SLOT
+
+        try:
+            r = win32.WriteProcessMemory(hProcess, lpAddress, lpBuffer)
+            if r != len(lpBuffer):
+                raise ctypes.WinError()
+        except Exception:
+            self.__inject_pool_release(lpAddress, len(lpBuffer))
+            raise
+        return lpAddress
+
+    def __inject_pool_release(self, lpAddress, dwSize, aThread=None):
+        """
+        Returns slots to the remote buffer pool.
+
+        Used internally by :meth:`inject_dll`.
+
+        :param int lpAddress: Address returned by :meth:`__inject_pool_alloc`.
+        :param int dwSize: Size of the buffer written there.
+        :param Thread aThread: Optional. Loader thread that timed out. The
+            slots are retired instead of freed, until the thread finishes.
+        """
+        count = max(1, -(-dwSize // _INJECT_POOL_SLOT))
+        with self.__inject_pool_lock:
+            if self.__inject_pool is not None:
+                start = (lpAddress - self.__inject_pool) // _INJECT_POOL_SLOT
+                self.__inject_pool_slots[start : start + count] = [aThread] * count
+
+    def __free_inject_pool(self):
+        """
+        Frees the remote buffer pool, unless a slot may still be used by a
+        thread that didn't finish.
+
+        Used internally by :meth:`close_handle`.
+        """
+        with self.__inject_pool_lock:
+            lpAddress = self.__inject_pool
+            if lpAddress is None:
+                return
+            for owner in self.__inject_pool_slots:
+                if owner is True:
+                    return
+                if owner is not None and not self.__has_exited(owner):
+                    return
+            self.__inject_pool = None
+            self.__inject_pool_slots = []
+        hProcess = self.hProcess
+        if hProcess is not None and hProcess != win32.INVALID_HANDLE_VALUE:
+            try:
+                win32.VirtualFreeEx(hProcess, lpAddress)
+            except WindowsError:
+                pass
+
     # TODO
     # The shellcode should check for errors, otherwise it just crashes
     # when the DLL can't be loaded or the procedure can't be found.
@@ -3254,7 +3808,14 @@ class Process(_ThreadContainer, _ModuleContainer):
             This is how the freeing of this memory is handled:
 
              - If the ``bWait`` flag is set to ``True`` the memory will be freed
-               automatically before returning from this method.
+               automatically before returning from this method. If the wait
+               times out the thread may still be using it, so it's kept in
+               :attr:`Thread.pInjectedMemory` of the thread, which can be
+               found with :meth:`get_thread`.
+             - When waiting, short library names are written to a page shared
+               by all calls instead. It's freed by :meth:`close_handle` and
+               :meth:`clear`, but not while a thread that timed out may still
+               be reading from it.
              - If the ``bWait`` flag is set to ``False``, the memory address is
                set as the :attr:`Thread.pInjectedMemory` property of the returned
                thread object.
@@ -3294,18 +3855,17 @@ class Process(_ThreadContainer, _ModuleContainer):
         """
 
         # Resolve kernel32.dll
-        aModule = self.get_module_by_name("kernel32.dll")
-        if aModule is None:
-            self.scan_modules()
-            aModule = self.get_module_by_name("kernel32.dll")
-        if aModule is None:
-            raise RuntimeError("Cannot resolve kernel32.dll in the remote process")
+        aModule = self.__get_kernel32_module()
+
+        # Set when the library name is borrowed from the remote buffer pool.
+        bPooled = False
 
         # Old method, using shellcode.
         if procname:
             if self.get_arch() != win32.ARCH_I386:
                 raise NotImplementedError()
-            dllname = str(dllname)
+            if not isinstance(dllname, (str, bytes)):
+                dllname = str(dllname)
 
             # Resolve kernel32.dll!LoadLibraryA
             pllib = aModule.resolve("LoadLibraryA")
@@ -3328,88 +3888,37 @@ class Process(_ThreadContainer, _ModuleContainer):
                     "Cannot resolve kernel32.dll!VirtualFree in the remote process"
                 )
 
-            # Shellcode follows...
-            code = b""
-
-            # push dllname
-            code += (
-                b"\xe8"
-                + struct.pack("<L", len(dllname) + 1)
-                + dllname.encode("ascii")
-                + b"\0"
+            # Get the shellcode template for these API addresses.
+            stub, dllname_at, procname_at, param_at = _inject_dll_shellcode(
+                pllib, pgpad, pvf, bWait
             )
 
-            # mov eax, LoadLibraryA
-            code += b"\xb8" + struct.pack("<L", pllib)
-
-            # call eax
-            code += b"\xff\xd0"
-
-            if procname:
-                # push procname
-                code += b"\xe8" + struct.pack("<L", len(procname) + 1)
-                code += procname.encode("ascii") + b"\0"
-
-                # push eax
-                code += b"\x50"
-
-                # mov eax, GetProcAddress
-                code += b"\xb8" + struct.pack("<L", pgpad)
-
-                # call eax
-                code += b"\xff\xd0"
-
-                # mov ebp, esp      ; preserve stack pointer
-                code += b"\x8b\xec"
-
-                # push lpParameter
-                code += b"\x68" + struct.pack("<L", lpParameter)
-
-                # call eax
-                code += b"\xff\xd0"
-
-                # mov esp, ebp      ; restore stack pointer
-                code += b"\x8b\xe5"
-
-            # pop edx       ; our own return address
-            code += b"\x5a"
-
-            # push MEM_RELEASE  ; dwFreeType
-            code += b"\x68" + struct.pack("<L", win32.MEM_RELEASE)
-
-            # push 0x1000       ; dwSize, shellcode max size 4096 bytes
-            code += b"\x68" + struct.pack("<L", 0x1000)
-
-            # call $+5
-            code += b"\xe8\x00\x00\x00\x00"
-
-            # and dword ptr [esp], 0xFFFFF000   ; align to page boundary
-            code += b"\x81\x24\x24\x00\xf0\xff\xff"
-
-            # mov eax, VirtualFree
-            code += b"\xb8" + struct.pack("<L", pvf)
-
-            # push edx      ; our own return address
-            code += b"\x52"
-
-            # jmp eax   ; VirtualFree will return to our own return address
-            code += b"\xff\xe0"
+            # Patch in the parameter and the string lengths, then insert the
+            # strings themselves, last one first so the offsets stay valid.
+            dllname_bytes = _dllname_to_ansi(dllname)
+            procname_bytes = procname.encode("ascii") + b"\0"
+            code = bytearray(stub)
+            _PACK_U32_INTO(code, dllname_at - 4, len(dllname_bytes))
+            _PACK_U32_INTO(code, procname_at - 4, len(procname_bytes))
+            _PACK_U32_INTO(code, param_at, lpParameter)
+            code[procname_at:procname_at] = procname_bytes
+            code[dllname_at:dllname_at] = dllname_bytes
 
             # Inject the shellcode.
-            # There's no need to free the memory,
+            # It's written in one piece by inject_code().
+            # There's no need to free the memory when not waiting,
             # because the shellcode will free it itself.
-            aThread, lpStartAddress = self.inject_code(code, lpParameter)
+            aThread, lpStartAddress = self.inject_code(bytes(code), lpParameter)
 
         # New method, not using shellcode.
         else:
             # Resolve kernel32.dll!LoadLibrary (A/W)
             if isinstance(dllname, str):
                 pllibname = "LoadLibraryW"
-                dllname_bytes = dllname.encode("utf-16le") + b"\0\0"
+                dllname_bytes = _dllname_to_unicode(dllname)
             else:
                 pllibname = "LoadLibraryA"
-                dllname_bytes = dllname + b"\0"
-            bufferlen = len(dllname_bytes)
+                dllname_bytes = _dllname_to_ansi(bytes(dllname))
 
             pllib = aModule.resolve(pllibname)
             if not pllib:
@@ -3417,10 +3926,15 @@ class Process(_ThreadContainer, _ModuleContainer):
                 raise RuntimeError(msg % pllibname)
 
             # Copy the library name into the process memory space.
-            pbuffer = self.malloc(bufferlen)
+            # If we're going to wait for the thread, a slot from the remote
+            # buffer pool will do, since we know when it can be reused.
+            pbuffer = None
+            if bWait:
+                pbuffer = self.__inject_pool_alloc(dllname_bytes)
+                bPooled = pbuffer is not None
+            if not bPooled:
+                pbuffer = self.malloc_and_write(dllname_bytes)
             try:
-                self.write(pbuffer, dllname_bytes)
-
                 # Create a new thread to load the library.
                 try:
                     aThread = self.start_thread(pllib, pbuffer)
@@ -3440,18 +3954,32 @@ class Process(_ThreadContainer, _ModuleContainer):
                 #  It will be freed ONLY by the Thread.kill() method
                 #  and the EventHandler class, otherwise you'll have to
                 #  free it in your code.
-                aThread.pInjectedMemory = pbuffer
+                #  Pool slots are not real allocations, so they're not
+                #  exposed here.
+                if not bPooled:
+                    aThread.pInjectedMemory = pbuffer
 
             # Free the memory on error.
             except Exception:
-                self.free(pbuffer)
+                if bPooled:
+                    self.__inject_pool_release(pbuffer, len(dllname_bytes))
+                else:
+                    self.free(pbuffer)
                 raise
 
-        # Wait for the thread to finish.
+        # Wait for the thread to finish and free the memory.
+        # On timeout an exception is raised and the memory is left alone,
+        # since the thread is still running.
         if bWait:
-            aThread.wait(dwTimeout)
-            self.free(aThread.pInjectedMemory)
-            del aThread.pInjectedMemory
+            if bPooled:
+                try:
+                    aThread.wait(dwTimeout)
+                except Exception:
+                    self.__inject_pool_release(pbuffer, len(dllname_bytes), aThread)
+                    raise
+                self.__inject_pool_release(pbuffer, len(dllname_bytes))
+            else:
+                aThread._join_and_reclaim(dwTimeout)
 
         # Return the thread object.
         return aThread
@@ -3466,6 +3994,38 @@ class Process(_ThreadContainer, _ModuleContainer):
             Setting ``bWait`` to ``True`` when the process is frozen by a
             debug event will cause a deadlock in your debugger.
 
+        :param int dwExitCode: Process exit code.
+        :param bool bWait:
+            ``True`` to wait for the process to finish.
+            ``False`` to return immediately.
+        :param int dwTimeout:
+            Optional timeout value in milliseconds.
+            Ignored if ``bWait`` is ``False``.
+        :raises WindowsError: An exception is raised on error.
+        """
+        pExitProcess = self.__pExitProcess
+        if pExitProcess is None:
+            pExitProcess = self.resolve_label("kernel32!ExitProcess")
+            self.__pExitProcess = pExitProcess
+        self.clean_exit_at(pExitProcess, dwExitCode, bWait, dwTimeout)
+
+    def clean_exit_at(self, pExitProcess, dwExitCode=0, bWait=False, dwTimeout=None):
+        """
+        Injects a new thread to call ExitProcess() at an already known address.
+        Optionally waits for the injected thread to finish.
+
+        This is useful when terminating many processes, since kernel32.dll is
+        loaded at the same address in all processes of the same architecture
+        until the next reboot, so ExitProcess() only has to be resolved once.
+
+        .. warning::
+
+            Setting ``bWait`` to ``True`` when the process is frozen by a
+            debug event will cause a deadlock in your debugger.
+
+        .. seealso:: :meth:`clean_exit`
+
+        :param int pExitProcess: Address of ExitProcess() in the process.
         :param int dwExitCode: Process exit code.
         :param bool bWait:
             ``True`` to wait for the process to finish.
@@ -3477,7 +4037,6 @@ class Process(_ThreadContainer, _ModuleContainer):
         """
         if not dwExitCode:
             dwExitCode = 0
-        pExitProcess = self.resolve_label("kernel32!ExitProcess")
         aThread = self.start_thread(pExitProcess, dwExitCode)
         if bWait:
             aThread.wait(dwTimeout)
@@ -3496,11 +4055,10 @@ class Process(_ThreadContainer, _ModuleContainer):
         :return: ``True`` to call the user-defined handle, ``False`` otherwise.
         """
         # Do not use super() here.
-        bCallHandler = _ThreadContainer._notify_create_process(self, event)
-        bCallHandler = bCallHandler and _ModuleContainer._notify_create_process(
-            self, event
-        )
-        return bCallHandler
+        # Both notifications must always run, so don't short-circuit them.
+        bCallHandler1 = _ThreadContainer._notify_create_process(self, event)
+        bCallHandler2 = _ModuleContainer._notify_create_process(self, event)
+        return bCallHandler1 and bCallHandler2
 
 
 # ==============================================================================
@@ -3556,8 +4114,54 @@ class _ProcessContainer:
     .. automethod:: get_module_count
     """
 
+    # Incremented on each call to scan_processes_and_threads(). It's shared by
+    # all containers, since a Process object may be in more than one of them.
+    __scanGen = 0
+
     def __init__(self):
-        self.__processDict = dict()
+        self.__set_process_dict(dict())
+        self.__initialized = False
+
+        # Index of processes by lowercase main module filename, without the
+        # path. Processes whose filename is still unknown are kept aside and
+        # indexed the next time a lookup needs them.
+        # The filename each process was indexed with is kept along with the
+        # filename split from it and the lowercase versions of both, so they
+        # are not computed again on every lookup.
+        self.__basenameIndex = dict()  # basename -> {pid: Process}
+        self.__basenameOf = dict()  # pid -> (basename, fileName, name, lower)
+        self.__unindexed = dict()  # pid -> Process
+
+        # Startup info used by start_process() to spawn children under
+        # another parent process, reused for as long as the parent lives.
+        self.__parentStartupInfo = dict()  # pid -> (hParent, List, StartupInfoEx)
+
+        # Owner of each thread found by the last Toolhelp scan,
+        # or reported by a debug event since then.
+        self.__tidToPid = dict()  # tid -> pid
+
+        # Bumped every time a process is added or removed. The last scan by
+        # scan_processes_fast() is remembered along with it, so a repeated
+        # scan that finds exactly the same processes can stop early.
+        self.__generation = 0
+        self.__lastFastScan = None  # (generation, {pid: filename})
+
+        # Buffer for NtQuerySystemInformation, reused across scans.
+        self.__systemInformation = None
+
+        # Our own process ID never changes, so get it only once.
+        self.__our_pid = win32.GetCurrentProcessId()
+
+    def __set_process_dict(self, processDict):
+        """
+        Private method to replace the process dictionary. The views returned
+        by the accessors are built here once, instead of on every call.
+
+        :param dict processDict: New process dictionary.
+        """
+        self.__processDict = processDict
+        self.__processIdsView = processDict.keys()
+        self.__processesView = processDict.values()
 
     def __initialize_snapshot(self):
         """
@@ -3565,12 +4169,15 @@ class _ProcessContainer:
         when you try to use it without calling any of the scan_*
         methods first. You don't need to call this yourself.
         """
+        if self.__initialized:
+            return
         if not self.__processDict:
             try:
                 self.scan_processes()  # remote desktop api (relative fn)
             except Exception:
                 self.scan_processes_fast()  # psapi (no filenames)
             self.scan_process_filenames()  # get the pathnames when possible
+        self.__initialized = True
 
     def __contains__(self, anObject):
         """
@@ -3586,9 +4193,19 @@ class _ProcessContainer:
         """
         if isinstance(anObject, Process):
             anObject = anObject.dwProcessId
-        if self.has_process(anObject):
+        self.__initialize_snapshot()
+        processDict = self.__processDict
+        if anObject in processDict:
             return True
-        for aProcess in self.iter_processes():
+
+        # Known thread IDs can be checked without going through every process.
+        dwThreadId = anObject
+        if isinstance(dwThreadId, Thread):
+            dwThreadId = dwThreadId.dwThreadId
+        if self.__get_known_thread_owner(dwThreadId) is not None:
+            return True
+
+        for aProcess in processDict.values():
             if anObject in aProcess:
                 return True
         return False
@@ -3639,8 +4256,9 @@ class _ProcessContainer:
         :rtype: dictionary-keyiterator
         :return: Iterator of global process IDs in this snapshot.
         """
-        self.__initialize_snapshot()
-        return self.__processDict.keys()
+        if not self.__initialized:
+            self.__initialize_snapshot()
+        return self.__processIdsView
 
     def iter_processes(self):
         """
@@ -3648,8 +4266,9 @@ class _ProcessContainer:
         :rtype: dictionary-valueiterator
         :return: Iterator of :class:`Process` objects in this snapshot.
         """
-        self.__initialize_snapshot()
-        return self.__processDict.values()
+        if not self.__initialized:
+            self.__initialize_snapshot()
+        return self.__processesView
 
     def get_process_ids(self):
         """
@@ -3657,15 +4276,17 @@ class _ProcessContainer:
         :rtype: list[int]
         :return: List of global process IDs in this snapshot.
         """
-        self.__initialize_snapshot()
-        return self.__processDict.keys()
+        if not self.__initialized:
+            self.__initialize_snapshot()
+        return self.__processIdsView
 
     def get_process_count(self):
         """
         :rtype: int
         :return: Count of :class:`Process` objects in this snapshot.
         """
-        self.__initialize_snapshot()
+        if not self.__initialized:
+            self.__initialize_snapshot()
         return len(self.__processDict)
 
     # ------------------------------------------------------------------------------
@@ -3684,14 +4305,27 @@ class _ProcessContainer:
             window_list.extend( process.get_windows() )
         return window_list"""
 
-        hCurWnd = None
-        window_list = list()
-        while True:
-            hCurWnd = win32.FindWindowEx(None, hCurWnd, None, None)
-            if hCurWnd is None:
-                break
-            window_list.append(Window(hCurWnd))
-        return window_list
+        # Get all the top-level window handles in a single call.
+        return [Window(hWnd) for hWnd in win32.EnumWindows()]
+
+    def __get_known_thread_owner(self, dwThreadId):
+        """
+        Private method to find the owner of a thread seen by the last Toolhelp
+        scan or by a debug event. Thread IDs get reused, so the answer is only
+        trusted while the thread is still in the snapshot.
+
+        Used internally by :meth:`get_pid_from_tid` and :meth:`__contains__`.
+
+        :param int dwThreadId: Thread global ID.
+        :rtype: int or None
+        :return: Process global ID, or ``None`` if unknown.
+        """
+        dwProcessId = self.__tidToPid.get(dwThreadId)
+        if dwProcessId is not None:
+            aProcess = self.__processDict.get(dwProcessId)
+            if aProcess is not None and aProcess._has_thread_id(dwThreadId):
+                return dwProcessId
+        return None
 
     def get_pid_from_tid(self, dwThreadId):
         """
@@ -3702,6 +4336,11 @@ class _ProcessContainer:
         :return: Process global ID.
         :raises KeyError: The thread does not exist.
         """
+        # Try the known threads first.
+        dwProcessId = self.__get_known_thread_owner(dwThreadId)
+        if dwProcessId is not None:
+            return dwProcessId
+
         try:
             # No good, because in XP and below it tries to get the PID
             # through the toolhelp API, and that's slow. We don't want
@@ -3756,6 +4395,56 @@ class _ProcessContainer:
 
     # ------------------------------------------------------------------------------
 
+    def __get_parent_startup_info(self, dwParentProcessId):
+        """
+        Private method to get the extended startup info that makes a new
+        process a child of the given parent process. The parent handle,
+        attribute list and startup info are built only once per parent, and
+        dropped when the parent process is removed from the snapshot or is
+        found to have exited.
+
+        Used internally by :meth:`start_process`.
+
+        :param int dwParentProcessId: Global ID of the parent process.
+        :rtype: :class:`~winappdbg.win32.STARTUPINFOEX`
+        :return: Startup info for :func:`~winappdbg.win32.CreateProcess`.
+        :raises WindowsError: The parent process could not be opened.
+        """
+        try:
+            ParentProcessHandle, _, StartupInfoEx = self.__parentStartupInfo[
+                dwParentProcessId
+            ]
+        except KeyError:
+            pass
+        else:
+            # Only reuse the cached handle while the parent is still running.
+            # The PID can't be recycled while we hold the handle, but a dead
+            # parent can't be used to create new processes either.
+            if win32.WaitForSingleObject(ParentProcessHandle, 0) == win32.WAIT_TIMEOUT:
+                return StartupInfoEx
+            del self.__parentStartupInfo[dwParentProcessId]
+        ParentProcessHandle = win32.OpenProcess(
+            win32.PROCESS_CREATE_PROCESS | win32.SYNCHRONIZE, False, dwParentProcessId
+        )
+        AttributeListData = (
+            (
+                win32.PROC_THREAD_ATTRIBUTE_PARENT_PROCESS,
+                ParentProcessHandle._as_parameter_,
+            ),
+        )
+        AttributeList = win32.ProcThreadAttributeList(AttributeListData)
+        # New ctypes structures are already zero filled,
+        # so only the size and the attribute list need to be set.
+        StartupInfoEx = win32.STARTUPINFOEX()
+        StartupInfoEx.StartupInfo.cb = win32.sizeof(win32.STARTUPINFOEX)
+        StartupInfoEx.lpAttributeList = AttributeList.value
+        self.__parentStartupInfo[dwParentProcessId] = (
+            ParentProcessHandle,
+            AttributeList,
+            StartupInfoEx,
+        )
+        return StartupInfoEx
+
     @staticmethod
     def argv_to_cmdline(argv):
         """
@@ -3770,10 +4459,10 @@ class _ProcessContainer:
         for token in argv:
             if not token:
                 token = '""'
-            else:
+            elif _NEEDS_ESCAPING(token):
                 if '"' in token:
                     token = token.replace('"', '\\"')
-                if " " in token or "\t" in token or "\n" in token or "\r" in token:
+                if _NEEDS_QUOTES(token):
                     token = '"%s"' % token
             cmdline.append(token)
         return " ".join(cmdline)
@@ -3900,33 +4589,9 @@ class _ProcessContainer:
         # May fail on old versions of Windows.
         lpStartupInfo = None
         if dwParentProcessId is not None:
-            myPID = win32.GetCurrentProcessId()
+            myPID = self.__our_pid
             if dwParentProcessId != myPID:
-                if self.has_process(dwParentProcessId):
-                    ParentProcess = self.get_process(dwParentProcessId)
-                else:
-                    ParentProcess = Process(dwParentProcessId)
-                ParentProcessHandle = ParentProcess.get_handle(
-                    win32.PROCESS_CREATE_PROCESS
-                )
-                AttributeListData = (
-                    (
-                        win32.PROC_THREAD_ATTRIBUTE_PARENT_PROCESS,
-                        ParentProcessHandle._as_parameter_,
-                    ),
-                )
-                AttributeList = win32.ProcThreadAttributeList(AttributeListData)
-                StartupInfoEx = win32.STARTUPINFOEX()
-                StartupInfo = StartupInfoEx.StartupInfo
-                StartupInfo.cb = win32.sizeof(win32.STARTUPINFOEX)
-                StartupInfo.lpReserved = 0
-                StartupInfo.lpDesktop = 0
-                StartupInfo.lpTitle = 0
-                StartupInfo.dwFlags = 0
-                StartupInfo.cbReserved2 = 0
-                StartupInfo.lpReserved2 = 0
-                StartupInfoEx.lpAttributeList = AttributeList.value
-                lpStartupInfo = StartupInfoEx
+                lpStartupInfo = self.__get_parent_startup_info(dwParentProcessId)
                 dwCreationFlags |= win32.EXTENDED_STARTUPINFO_PRESENT
 
         pi = None
@@ -4072,17 +4737,13 @@ class _ProcessContainer:
         :rtype: int|None
         :return: Returns the process ID, or None on error.
         """
-        try:
-            exp = win32.SHGetFolderPath(win32.CSIDL_WINDOWS)
-        except Exception:
-            exp = None
-        if not exp:
-            exp = getenv("SystemRoot")
+        exp = _get_explorer_pathname()
         if exp:
-            exp = ntpath.join(exp, "explorer.exe")
-            exp_list = self.find_processes_by_filename(exp)
-            if exp_list:
-                return exp_list[0][0].get_pid()
+            # Look up the filename in the index, then check the full path.
+            exp = exp.lower()
+            for aProcess, _ in self.find_processes_by_filename("explorer.exe"):
+                if aProcess.get_filename().lower() == exp:
+                    return aProcess.get_pid()
         return None
 
     # ------------------------------------------------------------------------------
@@ -4105,11 +4766,13 @@ class _ProcessContainer:
             snapshot is complete for all processes the debugger has access to.
         """
         has_threads = True
+        has_toolhelp = False
         try:
             try:
                 # Try using the Toolhelp API
                 # to scan for processes and threads.
                 self.scan_processes_and_threads()
+                has_toolhelp = True
 
             except Exception:
                 # On error, try using the PSAPI to scan for process IDs only.
@@ -4126,8 +4789,13 @@ class _ProcessContainer:
         finally:
             # Try using the Remote Desktop API to scan for processes only.
             # This will update the filenames when it's not possible
-            # to obtain them from the Toolhelp API.
-            self.scan_processes()
+            # to obtain them from the Toolhelp API. When the Toolhelp scan
+            # worked and got all the filenames, this second pass over every
+            # process in the system has nothing to add, so skip it.
+            if not has_toolhelp or not all(
+                aProcess.fileName for aProcess in self.__processDict.values()
+            ):
+                self.scan_processes()
 
         # When finished scanning for processes, try modules too.
         has_modules = self.scan_modules()
@@ -4160,63 +4828,69 @@ class _ProcessContainer:
         # since this information resides in usermode space.
         # See: http://www.ragestorm.net/blogs/?p=163
 
-        our_pid = win32.GetCurrentProcessId()
-        dead_pids = set(self.__processDict.keys())
-        found_tids = set()
+        our_pid = self.__our_pid
+        processDict = self.__processDict
+        found_tids_by_pid = defaultdict(set)
+        tidToPid = dict()
 
-        # Ignore our own process if it's in the snapshot for some reason
-        if our_pid in dead_pids:
-            dead_pids.remove(our_pid)
+        # Every process found alive is tagged with the number of this scan,
+        # the ones left with an older tag are dead.
+        _ProcessContainer.__scanGen += 1
+        gen = _ProcessContainer.__scanGen
 
         # Take a snapshot of all processes and threads
         dwFlags = win32.TH32CS_SNAPPROCESS | win32.TH32CS_SNAPTHREAD
         with win32.CreateToolhelp32Snapshot(dwFlags) as hSnapshot:
             # Add all the processes (excluding our own)
-            pe = win32.Process32First(hSnapshot)
-            while pe is not None:
-                dwProcessId = pe.th32ProcessID
-                if dwProcessId != our_pid:
-                    if dwProcessId in dead_pids:
-                        dead_pids.remove(dwProcessId)
-                    fileName = pe.szExeFile
-                    if isinstance(fileName, bytes):
-                        fileName = fileName.decode("mbcs", "ignore")
-                    if dwProcessId not in self.__processDict:
-                        aProcess = Process(dwProcessId, fileName=fileName)
-                        self._add_process(aProcess)
-                    elif fileName:
-                        aProcess = self.get_process(dwProcessId)
-                        if not aProcess.fileName:
-                            aProcess.fileName = fileName
-                pe = win32.Process32Next(hSnapshot)
+            # Our own process is never added, so it only needs to be checked
+            # for when a process is not in the snapshot yet.
+            for dwProcessId, fileName in _iter_process32(hSnapshot):
+                aProcess = processDict.get(dwProcessId)
+                if aProcess is None:
+                    if dwProcessId == our_pid:
+                        continue
+                    aProcess = Process(dwProcessId, fileName=fileName)
+                    self._add_process(aProcess)
+                elif fileName and not aProcess.fileName:
+                    aProcess.fileName = fileName
+                aProcess._seen_gen = gen
 
             # Add all the threads
-            te = win32.Thread32First(hSnapshot)
-            while te is not None:
-                dwProcessId = te.th32OwnerProcessID
-                if dwProcessId != our_pid:
-                    if dwProcessId in dead_pids:
-                        dead_pids.remove(dwProcessId)
-                    if dwProcessId in self.__processDict:
-                        aProcess = self.get_process(dwProcessId)
-                    else:
-                        aProcess = Process(dwProcessId)
-                        self._add_process(aProcess)
-                    dwThreadId = te.th32ThreadID
-                    found_tids.add(dwThreadId)
-                    if not aProcess._has_thread_id(dwThreadId):
-                        aThread = Thread(dwThreadId, process=aProcess)
-                        aProcess._add_thread(aThread)
-                te = win32.Thread32Next(hSnapshot)
+            for dwThreadId, dwProcessId in _iter_thread32(hSnapshot):
+                aProcess = processDict.get(dwProcessId)
+                if aProcess is None:
+                    if dwProcessId == our_pid:
+                        continue
+                    aProcess = Process(dwProcessId)
+                    self._add_process(aProcess)
+                aProcess._seen_gen = gen
+                found_tids_by_pid[dwProcessId].add(dwThreadId)
+                tidToPid[dwThreadId] = dwProcessId
+                if not aProcess._has_thread_id(dwThreadId):
+                    aThread = Thread(dwThreadId, process=aProcess)
+                    aProcess._add_thread(aThread)
 
         # Remove dead processes
-        for pid in dead_pids:
-            self._del_process(pid)
+        # Ignore our own process if it's in the snapshot for some reason
+        dead_pids = [
+            dwProcessId
+            for dwProcessId, aProcess in processDict.items()
+            if aProcess._seen_gen != gen and dwProcessId != our_pid
+        ]
+        self.__del_dead_processes(dead_pids)
+        self.__tidToPid = tidToPid
 
         # Remove dead threads
-        for aProcess in self.__processDict.values():
-            dead_tids = set(aProcess._get_thread_ids())
-            dead_tids.difference_update(found_tids)
+        # Only compare against the threads found for each process.
+        # All of those were added to the snapshot above, so when the counts
+        # match no thread has died and there's nothing to compare.
+        for dwProcessId, aProcess in processDict.items():
+            found_tids = found_tids_by_pid.get(dwProcessId, ())
+            if aProcess._get_thread_count() == len(found_tids):
+                continue
+            dead_tids = [
+                tid for tid in aProcess._iter_thread_ids() if tid not in found_tids
+            ]
             for tid in dead_tids:
                 aProcess._del_thread(tid)
 
@@ -4239,12 +4913,20 @@ class _ProcessContainer:
             doesn't have permission to scan some processes. In either case, the
             snapshot is complete for all processes the debugger has access to.
         """
+        # Each process is scanned with its own Toolhelp snapshot, and the
+        # GIL is released while waiting for it, so scan them in parallel.
+        processes = list(self.__processDict.values())
+        if not processes:
+            return True
         complete = True
-        for aProcess in self.__processDict.values():
-            try:
-                aProcess.scan_modules()
-            except WindowsError:
-                complete = False
+        workers = min(_SCAN_WORKERS, len(processes))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(p.scan_modules) for p in processes]
+            for future in futures:
+                try:
+                    future.result()
+                except WindowsError:
+                    complete = False
         return complete
 
     def scan_processes(self):
@@ -4271,57 +4953,23 @@ class _ProcessContainer:
             The snapshot was not modified.
         """
 
-        # Get the previous list of PIDs.
-        # We'll be removing live PIDs from it as we find them.
-        our_pid = win32.GetCurrentProcessId()
-        dead_pids = set(self.__processDict.keys())
-
-        # Ignore our own PID.
-        if our_pid in dead_pids:
-            dead_pids.remove(our_pid)
-
         # Get the list of processes from the Remote Desktop API.
+        # Always use the Unicode version, so the names come already decoded.
         pProcessInfo = None
         try:
-            pProcessInfo, dwCount = win32.WTSEnumerateProcesses(
+            pProcessInfo, dwCount = win32.WTSEnumerateProcessesW(
                 win32.WTS_CURRENT_SERVER_HANDLE
             )
 
-            # For each process found...
-            for index in range(dwCount):
-                sProcessInfo = pProcessInfo[index]
-
-                ##                # Ignore processes belonging to other sessions.
-                ##                if sProcessInfo.SessionId != win32.WTS_CURRENT_SESSION:
-                ##                    continue
-
-                # Ignore our own PID.
-                pid = sProcessInfo.ProcessId
-                if pid == our_pid:
-                    continue
-
-                # Remove the PID from the dead PIDs list.
-                if pid in dead_pids:
-                    dead_pids.remove(pid)
-
-                # Get the "process name".
-                # Empirically, this seems to be the filename without the path.
-                # (The MSDN docs aren't very clear about this API call).
-                fileName = sProcessInfo.pProcessName
-                if isinstance(fileName, bytes):
-                    fileName = fileName.decode("mbcs", "ignore")
-
-                # If the process is new, add a new Process object.
-                if pid not in self.__processDict:
-                    aProcess = Process(pid, fileName=fileName)
-                    self._add_process(aProcess)
-
-                # If the process was already in the snapshot, and the
-                # filename is missing, update the Process object.
-                elif fileName:
-                    aProcess = self.__processDict.get(pid)
-                    if not aProcess.fileName:
-                        aProcess.fileName = fileName
+            # Get the "process name" of each process found.
+            # Empirically, this seems to be the filename without the path.
+            # (The MSDN docs aren't very clear about this API call).
+            # Slicing the pointer gets all the entries in a single call,
+            # without copying them, instead of indexing it once per entry.
+            fileNames = {
+                sProcessInfo.ProcessId: sProcessInfo.pProcessName
+                for sProcessInfo in pProcessInfo[:dwCount]
+            }
 
         # Free the memory allocated by the Remote Desktop API.
         finally:
@@ -4331,15 +4979,14 @@ class _ProcessContainer:
                 except WindowsError:
                     pass
 
-        # At this point the only remaining PIDs from the old list are dead.
-        # Remove them from the snapshot.
-        for pid in dead_pids:
-            self._del_process(pid)
+        # Update the snapshot.
+        self.__apply_process_list(fileNames)
 
     def scan_processes_fast(self):
         """
         Populates the snapshot with running processes.
-        Only the PID is retrieved for each process.
+        Only the PID and the filename (without the path) are retrieved for
+        each process.
 
         Dead processes are removed.
         Threads and modules of living processes are ignored.
@@ -4349,33 +4996,82 @@ class _ProcessContainer:
 
         .. note::
 
-            This method uses the PSAPI. It may be faster for scanning,
-            but some information may be missing, outdated or slower to obtain.
-            This could be a good tradeoff under some circumstances.
+            This method uses the native API to get all processes with a single
+            call, falling back to the PSAPI (which only gets the PIDs) if that
+            fails. It may be faster for scanning, but some information may be
+            missing, outdated or slower to obtain. This could be a good
+            tradeoff under some circumstances.
         """
 
-        # Get the new and old list of pids
-        new_pids = set(win32.EnumProcesses())
-        old_pids = set(self.__processDict.keys())
+        # Get the new and old list of pids, and the filenames when possible
+        # The buffer is kept for the next scan, so it only has to be
+        # allocated again when the process list outgrows it.
+        try:
+            SystemInformation, _ = win32.NtQuerySystemInformation(
+                win32.SystemProcessInformation, self.__systemInformation
+            )
+        except WindowsError:
+            fileNames = dict.fromkeys(win32.EnumProcesses())
+        else:
+            self.__systemInformation = SystemInformation
+            fileNames = dict(_iter_system_processes(SystemInformation))
+
+        # If nothing changed since the last time, the snapshot is up to date.
+        if self.__lastFastScan == (self.__generation, fileNames):
+            return
+
+        # Update the snapshot.
+        self.__apply_process_list(fileNames)
+        self.__lastFastScan = (self.__generation, fileNames)
+
+    def __apply_process_list(self, fileNames):
+        """
+        Private method to update the snapshot with the list of running
+        processes. New processes are added, missing ones are removed, and the
+        ones already in the snapshot get their filename if it was unknown.
+        Our own process is ignored.
 
-        # Ignore our own pid
-        our_pid = win32.GetCurrentProcessId()
-        if our_pid in new_pids:
-            new_pids.remove(our_pid)
-        if our_pid in old_pids:
-            old_pids.remove(our_pid)
+        Used internally by :meth:`scan_processes` and
+        :meth:`scan_processes_fast`.
+
+        :param fileNames: Filename of each running process, or ``None``
+            when unknown.
+        :type  fileNames: dict(int, str)
+        """
+
+        # Compare the new pids against the old ones. The dictionary views
+        # support set operations directly, so there's no need to copy them.
+        # All of this must be done before the snapshot is modified.
+        # Our own pid is ignored.
+        our_pid = self.__our_pid
+        processDict = self.__processDict
+        old_pids = processDict.keys()
+        new_pids = fileNames.keys()
+        added_pids = new_pids - old_pids
+        added_pids.discard(our_pid)
+        kept_pids = new_pids & old_pids
+        dead_pids = old_pids - new_pids
+        dead_pids.discard(our_pid)
 
         # Add newly found pids
-        for pid in new_pids.difference(old_pids):
-            self._add_process(Process(pid))
+        for pid in added_pids:
+            self._add_process(Process(pid, fileName=fileNames[pid]))
+
+        # Fill in the missing filenames of the pids we already had
+        for pid in kept_pids:
+            fileName = fileNames[pid]
+            if fileName:
+                aProcess = processDict[pid]
+                if not aProcess.fileName:
+                    aProcess.fileName = fileName
 
         # Remove missing pids
-        for pid in old_pids.difference(new_pids):
-            self._del_process(pid)
+        self.__del_dead_processes(dead_pids)
 
     def scan_process_filenames(self):
         """
         Update the filename for each process in the snapshot when possible.
+        Processes that already have a full pathname are not queried again.
 
         .. note::
 
@@ -4395,22 +5091,77 @@ class _ProcessContainer:
             case, all processes the debugger has access to have a full pathname
             instead of just a filename.
         """
-        complete = True
-        for aProcess in self.__processDict.values():
+        # Processes that already have a full pathname are left alone, only
+        # the ones with no filename or just the filename need to be queried.
+        path_is_absolute = PathOperations.path_is_absolute
+        processes = [
+            aProcess
+            for aProcess in self.__processDict.values()
+            if not aProcess.fileName
+            or not isinstance(aProcess.fileName, str)
+            or not path_is_absolute(aProcess.fileName)
+        ]
+
+        # Nothing to do when all pathnames are known, which is the usual case
+        # when scanning again. A single process (typically a new one since
+        # the last scan) is not worth starting a thread pool for.
+        if not processes:
+            return True
+        if len(processes) == 1:
+            aProcess = processes[0]
+            old_name = aProcess.fileName
             try:
-                new_name = None
-                old_name = aProcess.fileName
-                try:
-                    aProcess.fileName = None
-                    new_name = aProcess.get_filename()
-                finally:
-                    if not new_name:
-                        aProcess.fileName = old_name
-                        complete = False
+                complete = self.__refresh_process_filename(aProcess)
             except Exception:
                 complete = False
+            if aProcess.fileName != old_name:
+                self.__index_process(aProcess)
+            return complete
+
+        # Each pathname is queried with its own process handle, and the GIL
+        # is released while waiting for it, so query them in parallel. The
+        # snapshot itself is only updated from this thread.
+        old_names = [aProcess.fileName for aProcess in processes]
+        complete = True
+        workers = min(_SCAN_WORKERS, len(processes))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self.__refresh_process_filename, aProcess)
+                for aProcess in processes
+            ]
+            for aProcess, old_name, future in zip(processes, old_names, futures):
+                try:
+                    if not future.result():
+                        complete = False
+                except Exception:
+                    complete = False
+                if aProcess.fileName != old_name:
+                    self.__index_process(aProcess)
         return complete
 
+    @staticmethod
+    def __refresh_process_filename(aProcess):
+        """
+        Private method to replace the filename of a process with its full
+        pathname when possible. The snapshot is not modified, so it's safe to
+        call from a worker thread.
+
+        Used internally by :meth:`scan_process_filenames`.
+
+        :param Process aProcess: Process object.
+        :rtype: bool
+        :return: ``True`` if the pathname was retrieved, ``False`` otherwise.
+        """
+        new_name = None
+        old_name = aProcess.fileName
+        try:
+            aProcess.fileName = None
+            new_name = aProcess.get_filename()
+        finally:
+            if not new_name:
+                aProcess.fileName = old_name
+        return bool(new_name)
+
     # ------------------------------------------------------------------------------
 
     def clear_dead_processes(self):
@@ -4418,8 +5169,7 @@ class _ProcessContainer:
         Removes Process objects from the snapshot
         referring to processes no longer running.
         """
-        for pid in list(self.get_process_ids()):
-            aProcess = self.get_process(pid)
+        for pid, aProcess in tuple(self.__processDict.items()):
             if not aProcess.is_alive():
                 self._del_process(pid)
 
@@ -4428,8 +5178,7 @@ class _ProcessContainer:
         Removes Process objects from the snapshot
         referring to processes not being debugged.
         """
-        for pid in list(self.get_process_ids()):
-            aProcess = self.get_process(pid)
+        for pid, aProcess in tuple(self.__processDict.items()):
             if not aProcess.is_being_debugged():
                 self._del_process(pid)
 
@@ -4437,8 +5186,7 @@ class _ProcessContainer:
         """
         Closes all open handles to processes in this snapshot.
         """
-        for pid in list(self.get_process_ids()):
-            aProcess = self.get_process(pid)
+        for aProcess in self.__processDict.values():
             try:
                 aProcess.close_handle()
             except Exception as e:
@@ -4453,7 +5201,7 @@ class _ProcessContainer:
         """
         Closes all open handles to processes and threads in this snapshot.
         """
-        for aProcess in list(self.iter_processes()):
+        for aProcess in self.__processDict.values():
             aProcess.close_thread_handles()
             try:
                 aProcess.close_handle()
@@ -4470,9 +5218,18 @@ class _ProcessContainer:
         Removes all :class:`Process`, :class:`Thread` and :class:`Module` objects in this snapshot.
         """
         # self.close_process_and_thread_handles()
-        for aProcess in list(self.iter_processes()):
+        for aProcess in self.__processDict.values():
             aProcess.clear()
-        self.__processDict = dict()
+        self.__set_process_dict(dict())
+        self.__initialized = False
+        self.__basenameIndex = dict()
+        self.__basenameOf = dict()
+        self.__unindexed = dict()
+        self.__parentStartupInfo = dict()
+        self.__tidToPid = dict()
+        self.__generation += 1
+        self.__lastFastScan = None
+        self.__systemInformation = None
 
     def clear(self):
         """
@@ -4500,16 +5257,14 @@ class _ProcessContainer:
         return self.get_process(dwProcessId).get_thread(dwThreadId)
 
     def get_thread_ids(self):
-        ids = list()
-        for aProcess in self.iter_processes():
-            ids += aProcess.get_thread_ids()
-        return ids
+        return list(
+            itertools.chain.from_iterable(
+                aProcess.get_thread_ids() for aProcess in self.iter_processes()
+            )
+        )
 
     def get_thread_count(self):
-        count = 0
-        for aProcess in self.iter_processes():
-            count += aProcess.get_thread_count()
-        return count
+        return sum(aProcess.get_thread_count() for aProcess in self.iter_processes())
 
     has_thread.__doc__ = _ThreadContainer.has_thread.__doc__
     get_thread.__doc__ = _ThreadContainer.get_thread.__doc__
@@ -4521,10 +5276,7 @@ class _ProcessContainer:
     # Docs for these methods are taken from the _ModuleContainer class.
 
     def get_module_count(self):
-        count = 0
-        for aProcess in self.iter_processes():
-            count += aProcess.get_module_count()
-        return count
+        return sum(aProcess.get_module_count() for aProcess in self.iter_processes())
 
     get_module_count.__doc__ = _ModuleContainer.get_module_count.__doc__
 
@@ -4575,18 +5327,40 @@ class _ProcessContainer:
         """
         found = list()
         filename = filename.lower()
-        if PathOperations.path_is_absolute(filename):
-            for aProcess in self.iter_processes():
-                imagename = aProcess.get_filename()
-                if imagename and imagename.lower() == filename:
-                    found.append((aProcess, imagename))
+
+        # Only the processes indexed under this name can match. A full
+        # pathname can only match the processes indexed under its filename.
+        bAbsolute = PathOperations.path_is_absolute(filename)
+        if bAbsolute:
+            basename = PathOperations.pathname_to_filename(filename)
         else:
-            for aProcess in self.iter_processes():
+            basename = filename
+        self.__initialize_snapshot()
+        for aProcess in list(self.__unindexed.values()):
+            if aProcess.get_filename():
+                self.__index_process(aProcess)
+        candidates = self.__basenameIndex.get(basename)
+        if candidates:
+            basenameOf = self.__basenameOf
+            for aProcess in list(candidates.values()):
                 imagename = aProcess.get_filename()
                 if imagename:
-                    imagename = PathOperations.pathname_to_filename(imagename)
-                    if imagename.lower() == filename:
+                    # If the filename changed since it was indexed, index it
+                    # again. It only stays here if the filename part is the
+                    # same (for example, if the full pathname was found).
+                    _, indexed, name, lower = basenameOf[aProcess.dwProcessId]
+                    if imagename != indexed:
+                        self.__index_process(aProcess)
+                        if aProcess.dwProcessId not in candidates:
+                            continue
+                        _, indexed, name, lower = basenameOf[aProcess.dwProcessId]
+                    if not bAbsolute:
+                        found.append((aProcess, name))
+                    elif lower == filename:
                         found.append((aProcess, imagename))
+                else:
+                    # The filename is gone, so it's no longer indexed.
+                    self.__index_process(aProcess)
         return found
 
     def find_processes_by_filename(self, fileName):
@@ -4620,6 +5394,8 @@ class _ProcessContainer:
         """
         dwProcessId = aProcess.dwProcessId
         self.__processDict[dwProcessId] = aProcess
+        self.__index_process(aProcess)
+        self.__generation += 1
 
     def _del_process(self, dwProcessId):
         """
@@ -4634,9 +5410,89 @@ class _ProcessContainer:
             msg = "Unknown process ID %d" % dwProcessId
             warnings.warn(msg, RuntimeWarning)
         if aProcess is not None:
+            self.__generation += 1
+            self.__unindex_process(dwProcessId)
+            self.__parentStartupInfo.pop(dwProcessId, None)
+            self.__forget_threads_of(aProcess)
             aProcess.clear()  # remove circular references
         return aProcess
 
+    def __del_dead_processes(self, dwProcessIds):
+        """
+        Private method to remove many process objects from the snapshot at
+        once. Unlike :meth:`_del_process` the process IDs must be known to be
+        in the snapshot.
+
+        Used internally by the scan methods.
+
+        :param dwProcessIds: Global process IDs.
+        :type  dwProcessIds: iterable of int
+        """
+        processDict = self.__processDict
+        dead = [processDict.pop(dwProcessId) for dwProcessId in dwProcessIds]
+        if dead:
+            self.__generation += 1
+        parentStartupInfo = self.__parentStartupInfo
+        for aProcess in dead:
+            self.__unindex_process(aProcess.dwProcessId)
+            parentStartupInfo.pop(aProcess.dwProcessId, None)
+            self.__forget_threads_of(aProcess)
+            aProcess.clear()  # remove circular references
+
+    def __forget_threads_of(self, aProcess):
+        """
+        Private method to drop the threads of a process from the thread
+        owner cache used by :meth:`get_pid_from_tid`.
+
+        :param Process aProcess: Process object.
+        """
+        tidToPid = self.__tidToPid
+        dwProcessId = aProcess.dwProcessId
+        for dwThreadId in aProcess._get_thread_ids():
+            if tidToPid.get(dwThreadId) == dwProcessId:
+                del tidToPid[dwThreadId]
+
+    def __index_process(self, aProcess):
+        """
+        Private method to add a process object to the filename index, or
+        update its entry if it was already there. If the filename is not
+        known yet, the process is indexed later by
+        :meth:`__find_processes_by_filename`.
+
+        :param Process aProcess: Process object.
+        """
+        dwProcessId = aProcess.dwProcessId
+        self.__unindex_process(dwProcessId)
+        fileName = aProcess.fileName
+        if fileName and isinstance(fileName, str):
+            name = PathOperations.pathname_to_filename(fileName)
+            basename = name.lower()
+            self.__basenameIndex.setdefault(basename, dict())[dwProcessId] = aProcess
+            self.__basenameOf[dwProcessId] = (
+                basename,
+                fileName,
+                name,
+                fileName.lower(),
+            )
+        else:
+            self.__unindexed[dwProcessId] = aProcess
+
+    def __unindex_process(self, dwProcessId):
+        """
+        Private method to remove a process object from the filename index.
+
+        :param int dwProcessId: Global process ID.
+        """
+        entry = self.__basenameOf.pop(dwProcessId, None)
+        if entry is None:
+            self.__unindexed.pop(dwProcessId, None)
+        else:
+            basename = entry[0]
+            candidates = self.__basenameIndex[basename]
+            del candidates[dwProcessId]
+            if not candidates:
+                del self.__basenameIndex[basename]
+
     # Notify the creation of a new process.
     def _notify_create_process(self, event):
         """
@@ -4664,6 +5520,7 @@ class _ProcessContainer:
                 fileName = event.get_filename()
                 if fileName:
                     aProcess.fileName = fileName
+        self.__tidToPid[event.get_tid()] = dwProcessId
         return aProcess._notify_create_process(event)  # pass it to the process
 
     def _notify_exit_process(self, event):
@@ -4682,3 +5539,33 @@ class _ProcessContainer:
         if dwProcessId in self.__processDict:
             self._del_process(dwProcessId)
         return True
+
+    def _notify_create_thread(self, event):
+        """
+        Notify the creation of a new thread.
+
+        This is done automatically by the :class:`Debug` class, you shouldn't need
+        to call it yourself.
+
+        :param CreateThreadEvent event: Create thread event.
+        :rtype: bool
+        :return: ``True`` to call the user-defined handle, ``False`` otherwise.
+        """
+        self.__tidToPid[event.get_tid()] = event.get_pid()
+        return True
+
+    def _notify_exit_thread(self, event):
+        """
+        Notify the termination of a thread.
+
+        This is done automatically by the :class:`Debug` class, you shouldn't need
+        to call it yourself.
+
+        :param ExitThreadEvent event: Exit thread event.
+        :rtype: bool
+        :return: ``True`` to call the user-defined handle, ``False`` otherwise.
+        """
+        dwThreadId = event.get_tid()
+        if self.__tidToPid.get(dwThreadId) == event.get_pid():
+            del self.__tidToPid[dwThreadId]
+        return True
@@ -33,6 +33,7 @@
 __all__ = ["System"]
 
 import ctypes
+import functools
 import glob
 import ntpath
 import os
@@ -277,12 +278,16 @@ class System(_ProcessContainer):
             win32.AdjustTokenPrivileges(hToken, NewState)
 
     @staticmethod
+    @functools.lru_cache(maxsize=1)
     def is_admin():
         """
         :rtype:  bool
         :return: ``True`` if the current user as Administrator privileges,
             ``False`` otherwise. Since Windows Vista and above this means if
             the current process is running with UAC elevation or not.
+
+        .. note:: The elevation of a process can't change while it runs,
+            so the answer is only queried once and then cached.
         """
         return win32.IsUserAnAdmin()
 
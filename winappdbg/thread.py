@@ -311,6 +311,27 @@ class Thread:
                 ##                raise           # XXX DEBUG
                 pass
 
+    def _join_and_reclaim(self, dwTimeout=None):
+        """
+        Waits for the thread to finish, then frees the memory pointed to by
+        :attr:`pInjectedMemory`, if any.
+
+        If the wait times out an exception is raised and the memory is kept,
+        since the thread may still be using it.
+
+        Used internally by :meth:`Process.inject_dll`.
+
+        :type  dwTimeout: int
+        :param dwTimeout: (Optional) Timeout value in milliseconds.
+            Use ``INFINITE`` or ``None`` for no timeout.
+        """
+        self.wait(dwTimeout)
+        pInjectedMemory = self.pInjectedMemory
+        if pInjectedMemory is not None:
+            # Forget the address first, so kill() won't free it again.
+            self.pInjectedMemory = None
+            self.get_process().free(pInjectedMemory)
+
     # XXX TODO
     # suspend() and resume() should have a counter of how many times a thread
     # was suspended, so on debugger exit they could (optionally!) be restored
@@ -422,6 +443,12 @@ class Thread:
         :rtype:  dict( str -> int )
         :return: Dictionary mapping register names to their values.
 
+        .. note:: On 64 bit Windows the dictionary converts the registers
+            lazily, as they're looked up. Calling the ``dict`` methods
+            directly on it, like ``dict.get(ctx, "Rip")``, bypasses this and
+            only finds ``ContextFlags``. Use ``ctx.get("Rip")`` or
+            ``ctx["Rip"]`` instead, or convert it with ``dict(ctx)`` first.
+
         .. seealso:: :meth:`set_context`
         """
 
@@ -1955,6 +1982,21 @@ class _ThreadContainer:
         """
         return list(self.__threadDict)
 
+    def _iter_thread_ids(self):
+        """
+        Private method to get a live view of the thread IDs currently in the
+        snapshot without copying them or triggering an automatic scan. The
+        snapshot must not be modified while iterating it.
+        """
+        return self.__threadDict.keys()
+
+    def _get_thread_count(self):
+        """
+        Private method to count the threads currently in the snapshot
+        without triggering an automatic scan.
+        """
+        return len(self.__threadDict)
+
     def __add_created_thread(self, event):
         """
         Private method to automatically add new thread objects from debug events.
@@ -90,7 +90,7 @@ def main():
         process = Process(pid)
         fileName = process.get_filename()
         memoryMap = process.get_memory_map()
-        mappedFilenames = process.get_mapped_filenames()
+        mappedFilenames = process.get_mapped_filenames(memoryMap)
         if fileName:
             print("Memory map for %d (%s):" % (pid, fileName))
         else:
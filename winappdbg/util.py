@@ -49,12 +49,15 @@ __all__ = [
     "IntelDebugRegister",
     # Miscellaneous
     "Regenerator",
+    "SparseBuffer",
     "pretty_ctypes",
     "dump_ctypes",
 ]
 
 import os
 import ctypes
+import functools
+import operator
 from collections import namedtuple
 
 from . import win32
@@ -63,6 +66,23 @@ from . import win32
 # ==============================================================================
 
 
+# Used by SparseBuffer. numpy is optional and takes a while to import, so it's
+# only looked for the first time it's needed. False means not looked for yet.
+_numpy = False
+
+
+def _get_numpy():
+    global _numpy
+    if _numpy is False:
+        try:
+            # https://pypi.org/project/numpy/
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
 _FieldInfo = namedtuple("_FieldInfo", "name ctype value")
 
 
@@ -215,6 +235,109 @@ class Regenerator(object):
     next = __next__
 
 
+# See Process.take_memory_snapshot()
+class SparseBuffer:
+    """
+    Read-only buffer that doesn't keep in memory the pages filled with
+    zeros. Useful to hold large memory contents that are mostly empty.
+
+    Use ``bytes(buffer)`` to get the actual contents.
+
+    :ivar int size: Size of the buffer in bytes.
+    :ivar dict[int, bytes] pages: Pages that are not filled with zeros,
+        indexed by their offset in the buffer.
+    """
+
+    def __init__(self, data):
+        """
+        :param bytes data: Buffer contents.
+        """
+        pageSize = MemoryAddresses.pageSize
+        size = len(data)
+        pages = dict()
+        self.size = size
+        self.pages = pages
+
+        # Most of the time the whole buffer is either empty or full of data,
+        # so test that first with a single comparison.
+        if data == bytes(size):
+            return
+
+        # Find out which pages are not empty.
+        # If numpy is available, test all the pages at once.
+        count = size // pageSize
+        numpy = None
+        if count and pageSize % 8 == 0:
+            numpy = _get_numpy()
+        if numpy is not None:
+            array = numpy.frombuffer(data, numpy.uint64, count * pageSize // 8)
+            used = array.reshape(count, -1).any(axis=1).nonzero()[0]
+            offsets = [int(index) * pageSize for index in used]
+            if count * pageSize < size:
+                offsets.append(count * pageSize)
+        else:
+            offsets = range(0, size, pageSize)
+        zeroPage = bytes(pageSize)
+        for offset in offsets:
+            page = data[offset : offset + pageSize]
+            if page != zeroPage[: len(page)]:
+                pages[offset] = page
+
+    def __len__(self):
+        return self.size
+
+    def __bytes__(self):
+        data = bytearray(self.size)
+        for offset, page in self.pages.items():
+            data[offset : offset + len(page)] = page
+        return bytes(data)
+
+    def __getitem__(self, key):
+        size = self.size
+        if not isinstance(key, slice):
+            index = operator.index(key)
+            if index < 0:
+                index += size
+            if not 0 <= index < size:
+                raise IndexError("SparseBuffer index out of range")
+            pageSize = MemoryAddresses.pageSize
+            offset = index - index % pageSize
+            page = self.pages.get(offset)
+            if page is None:
+                return 0
+            return page[index - offset]
+        start, stop, step = key.indices(size)
+        if step < 0:
+            start, stop = stop + 1, start + 1
+        if start >= stop:
+            return b""
+
+        # Only copy the pages that overlap the slice.
+        data = bytearray(stop - start)
+        pageSize = MemoryAddresses.pageSize
+        pages = self.pages
+        for offset in range(start - start % pageSize, stop, pageSize):
+            page = pages.get(offset)
+            if page is not None:
+                first = max(start, offset)
+                last = min(stop, offset + len(page))
+                data[first - start : last - start] = page[
+                    first - offset : last - offset
+                ]
+        if step != 1:
+            data = data[::step]
+        return bytes(data)
+
+    def __eq__(self, other):
+        if isinstance(other, SparseBuffer):
+            return self.size == other.size and self.pages == other.pages
+        if isinstance(other, (bytes, bytearray, memoryview)):
+            return bytes(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+
 class StaticClass:
     def __new__(cls, *argv, **argd):
         "Don't try to instance this class, just use the static methods."
@@ -462,11 +585,15 @@ class MemoryAddresses(StaticClass):
         return address + cls.pageSize - (address % cls.pageSize)
 
     @classmethod
+    @functools.lru_cache(maxsize=64)
     def align_address_range(cls, begin, end):
         """
         Align the given address range to the start and end of the page(s) it
         occupies.
 
+        Results are cached, since memory scanning loops tend to ask for the
+        same ranges over and over again.
+
         :type begin: int
         :param begin:
             Memory address of the beginning of the buffer. Use ``None`` for
@@ -58,9 +58,12 @@ The module also provides Win32 API wrappers for context operations:
 """
 
 import ctypes
+import threading
+from operator import attrgetter, itemgetter
 
 from . import context_i386
 from .defines import (
+    BOOL,
     BYTE,
     DWORD,
     DWORD64,
@@ -71,6 +74,7 @@ from .defines import (
     RaiseIfZero,
     Structure,
     Union,
+    WINFUNCTYPE,
     byref,
     sizeof,
     windll,
@@ -123,6 +127,32 @@ INITIAL_MXCSR = 0x1F80  # initial MXCSR value
 INITIAL_FPCSR = 0x027F  # initial FPCSR value
 
 
+# Used by the to_dict() and from_dict() methods below to convert M128A values
+# to and from Python integers. Copying the raw memory in one go is cheaper
+# than going through the Low and High members of every element in ctypes.
+_M128A_MASK = (1 << 128) - 1
+
+
+def _m128a_to_int(value):
+    return int.from_bytes(bytes(value), "little", signed=True)
+
+
+def _m128a_array_to_bytes(values):
+    if isinstance(values, (bytes, bytearray)):
+        return values
+    return b"".join([(x & _M128A_MASK).to_bytes(16, "little") for x in values])
+
+
+def _m128a_array_to_tuple(array):
+    raw = bytes(array)
+    return tuple(
+        [
+            int.from_bytes(raw[i : i + 16], "little", signed=True)
+            for i in range(0, len(raw), 16)
+        ]
+    )
+
+
 # typedef struct _XMM_SAVE_AREA32 {
 #     WORD   ControlWord;
 #     WORD   StatusWord;
@@ -202,11 +232,9 @@ class XMM_SAVE_AREA32(Structure):
         d = dict()
         for name, type in self._fields_:
             if name in ("FloatRegisters", "XmmRegisters"):
-                d[name] = tuple(
-                    [(x.LowPart + (x.HighPart << 64)) for x in getattr(self, name)]
-                )
+                d[name] = _m128a_array_to_tuple(getattr(self, name))
             elif name == "Reserved4":
-                d[name] = tuple([chr(x) for x in getattr(self, name)])
+                d[name] = bytes(self.Reserved4)
             else:
                 d[name] = getattr(self, name)
         return d
@@ -413,10 +441,9 @@ class _CONTEXT_FLTSAVE_STRUCT(Structure):
         d = dict()
         for name, type in self._fields_:
             if name in ("Header", "Legacy"):
-                d[name] = tuple([(x.Low + (x.High << 64)) for x in getattr(self, name)])
+                d[name] = _m128a_array_to_tuple(getattr(self, name))
             else:
-                x = getattr(self, name)
-                d[name] = x.Low + (x.High << 64)
+                d[name] = _m128a_to_int(getattr(self, name))
         return d
 
 
@@ -595,7 +622,6 @@ class CONTEXT(Structure):
         "P5Home",
         "P6Home",
         "MxCsr",
-        "VectorRegister",
         "VectorControl",
     )
     _control = ("SegSs", "Rsp", "SegCs", "Rip", "EFlags")
@@ -650,78 +676,97 @@ class CONTEXT(Structure):
         "Xmm15",
     )
 
-    # XXX TODO
-    # Convert VectorRegister and Xmm0-Xmm15 to pure Python types!
+    # (name, getter) pairs for each register group, built once per class.
+    _others_getters = tuple((key, attrgetter(key)) for key in _others)
+    _control_getters = tuple((key, attrgetter(key)) for key in _control)
+    _integer_getters = tuple((key, attrgetter(key)) for key in _integer)
+    _segments_getters = tuple((key, attrgetter(key)) for key in _segments)
+    _debug_getters = tuple((key, attrgetter(key)) for key in _debug)
+
+    # Maps ContextFlags values to the getters for the integer valued
+    # registers included in that context, so the flags are only tested
+    # once for each distinct value.
+    _register_getters = {}
 
     @classmethod
-    def from_dict(cls, ctx):
-        ctx = Context(ctx)
-        s = cls()
-        ContextFlags = ctx["ContextFlags"]
-        s.ContextFlags = ContextFlags
-        for key in cls._others:
-            if key != "VectorRegister":
-                setattr(s, key, ctx[key])
-            else:
-                w = ctx[key]
-                v = (M128A * len(w))()
-                i = 0
-                for x in w:
-                    y = M128A()
-                    y.High = x >> 64
-                    y.Low = x - (x >> 64)
-                    v[i] = y
-                    i += 1
-                setattr(s, key, v)
+    def _get_register_getters(cls, ContextFlags):
+        """
+        Used internally by :meth:`from_dict`, :meth:`to_dict` and
+        :class:`_LazyContext`.
+
+        :param int ContextFlags: Context flags.
+        :rtype: dict(str -> callable)
+        :return: Dictionary mapping register names to their getters, for all
+            the registers included in the context that don't need any
+            conversion into Python types.
+        """
+        try:
+            return cls._register_getters[ContextFlags]
+        except KeyError:
+            pass
+        getters = {"ContextFlags": attrgetter("ContextFlags")}
+        getters.update(cls._others_getters)
         if (ContextFlags & CONTEXT_CONTROL) == CONTEXT_CONTROL:
-            for key in cls._control:
-                setattr(s, key, ctx[key])
+            getters.update(cls._control_getters)
         if (ContextFlags & CONTEXT_INTEGER) == CONTEXT_INTEGER:
-            for key in cls._integer:
-                setattr(s, key, ctx[key])
+            getters.update(cls._integer_getters)
         if (ContextFlags & CONTEXT_SEGMENTS) == CONTEXT_SEGMENTS:
-            for key in cls._segments:
-                setattr(s, key, ctx[key])
+            getters.update(cls._segments_getters)
         if (ContextFlags & CONTEXT_DEBUG_REGISTERS) == CONTEXT_DEBUG_REGISTERS:
-            for key in cls._debug:
-                setattr(s, key, ctx[key])
+            getters.update(cls._debug_getters)
+        cls._register_getters[ContextFlags] = getters
+        return getters
+
+    @classmethod
+    def from_dict(cls, ctx):
+        if not isinstance(ctx, dict):
+            # Another CONTEXT structure or a raw buffer: one block copy.
+            return cls.from_buffer_copy(ctx)
+        if type(ctx) is _LazyContext:
+            # Still untouched, so the structure it wraps is up to date.
+            return cls.from_buffer_copy(ctx._raw)
+        s = cls()
+        ContextFlags = ctx["ContextFlags"]
+        for key in cls._get_register_getters(ContextFlags):
+            setattr(s, key, ctx[key])
         if (ContextFlags & CONTEXT_MMX_REGISTERS) == CONTEXT_MMX_REGISTERS:
-            xmm = s.FltSave.xmm
-            for key in cls._mmx:
-                y = M128A()
-                y.High = x >> 64
-                y.Low = x - (x >> 64)
-                setattr(xmm, key, y)
+            # The vector registers travel with the floating point state,
+            # so there's no need to marshal them when it wasn't requested.
+            raw = _m128a_array_to_bytes(ctx["VectorRegister"])
+            if len(raw) != sizeof(M128A) * 26:
+                raise ValueError("Expected 26 vector registers")
+            ctypes.memmove(s.VectorRegister, raw, len(raw))
+            raw = _m128a_array_to_bytes([ctx[key] for key in cls._mmx])
+            ctypes.memmove(ctypes.addressof(s) + _XMM0_OFFSET, raw, len(raw))
         return s
 
     def to_dict(self):
         "Convert a structure into a Python dictionary."
-        ctx = Context()
         ContextFlags = self.ContextFlags
-        ctx["ContextFlags"] = ContextFlags
-        for key in self._others:
-            if key != "VectorRegister":
-                ctx[key] = getattr(self, key)
-            else:
-                ctx[key] = tuple([(x.Low + (x.High << 64)) for x in getattr(self, key)])
-        if (ContextFlags & CONTEXT_CONTROL) == CONTEXT_CONTROL:
-            for key in self._control:
-                ctx[key] = getattr(self, key)
-        if (ContextFlags & CONTEXT_INTEGER) == CONTEXT_INTEGER:
-            for key in self._integer:
-                ctx[key] = getattr(self, key)
-        if (ContextFlags & CONTEXT_SEGMENTS) == CONTEXT_SEGMENTS:
-            for key in self._segments:
-                ctx[key] = getattr(self, key)
-        if (ContextFlags & CONTEXT_DEBUG_REGISTERS) == CONTEXT_DEBUG_REGISTERS:
-            for key in self._debug:
-                ctx[key] = getattr(self, key)
+        getters = self._get_register_getters(ContextFlags)
+        ctx = Context((key, getter(self)) for key, getter in getters.items())
         if (ContextFlags & CONTEXT_MMX_REGISTERS) == CONTEXT_MMX_REGISTERS:
-            xmm = self.FltSave.xmm.to_dict()
-            for key in self._mmx:
-                ctx[key] = xmm.get(key)
+            ctx["VectorRegister"] = _m128a_array_to_tuple(self.VectorRegister)
+            # Xmm0-Xmm15 are contiguous, read them straight from the union
+            # instead of converting the whole floating point state.
+            xmm = ctypes.string_at(
+                ctypes.addressof(self) + _XMM0_OFFSET, sizeof(M128A) * 16
+            )
+            ctx.update(zip(self._mmx, _m128a_array_to_tuple(xmm)))
         return ctx
 
+    def to_struct(self):
+        """
+        :rtype: CONTEXT
+        :return: This same structure. Lets :func:`SetThreadContext` take
+            either a :class:`CONTEXT` or a :class:`Context` without checking.
+        """
+        return self
+
+
+# Used by CONTEXT.from_dict() and CONTEXT.to_dict(),
+# offset of Xmm0 from the start of the structure.
+_XMM0_OFFSET = CONTEXT.FltSave.offset + _CONTEXT_FLTSAVE_STRUCT.Xmm0.offset
 
 PCONTEXT = ctypes.POINTER(CONTEXT)
 LPCONTEXT = PCONTEXT
@@ -760,6 +805,14 @@ class Context(dict):
 
     arch = CONTEXT.arch
 
+    # No per-instance __dict__, contexts are created on every debug event.
+    # The slots are only used by :class:`_LazyContext`, but they must be
+    # declared here so it can turn itself into a :class:`Context`.
+    __slots__ = ("_raw", "_getters")
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
     def __get_pc(self):
         """Program counter (instruction pointer) register."""
         return self["Rip"]
@@ -811,6 +864,142 @@ class Context(dict):
         """,
     )
 
+    def registers(self, *names):
+        """
+        Reads several registers at once.
+
+        :Example:
+
+        .. code-block:: python
+
+            rip, rsp, rax = context.registers("Rip", "Rsp", "Rax")
+
+        :param str names: Register names.
+        :rtype: tuple(int)
+        :return: Register values, in the same order as the names.
+            An empty tuple if no names are given.
+        :raises KeyError: One of the registers is not in the context.
+        """
+        if len(names) > 1:
+            return itemgetter(*names)(self)
+        if names:
+            return (self[names[0]],)
+        return ()
+
+    def to_struct(self):
+        """
+        :rtype: CONTEXT
+        :return: Context structure with the values in this dictionary.
+        """
+        return CONTEXT.from_dict(self)
+
+
+class _LazyContext(Context):
+    """
+    Register context dictionary that reads from a :class:`CONTEXT` structure
+    on demand.
+
+    This is what :func:`GetThreadContext` returns. Looking up registers only
+    converts the ones requested into Python integers, which is all most
+    breakpoint handlers ever do. Anything else (iterating, modifying,
+    comparing, pickling...) converts the whole structure first and turns
+    this object into a regular :class:`Context`.
+
+    The dictionary methods are overridden in Python, so code calling the C
+    level dictionary API directly, like ``dict.get(ctx, "Rip")`` or
+    ``dict.__getitem__(ctx, "Rip")``, bypasses them and only finds the
+    ``ContextFlags`` key. Use the regular methods or operators instead, or
+    call ``dict(ctx)`` first to get a plain copy.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, raw):
+        """
+        :param CONTEXT raw: Context structure. It's kept by reference,
+            so it must not be modified afterwards.
+        """
+        # The flags are always there, and having at least one item keeps
+        # C code that peeks at the dictionary size from taking it as empty.
+        Context.__init__(self, ContextFlags=raw.ContextFlags)
+        self._raw = raw
+        self._getters = raw._get_register_getters(raw.ContextFlags)
+
+    def _materialize(self):
+        """
+        Converts the wrapped structure into dictionary items and turns this
+        object into a regular :class:`Context`.
+
+        :rtype: Context
+        :return: This same object.
+        """
+        raw = self._raw
+        del self._raw
+        del self._getters
+        self.__class__ = Context
+        dict.update(self, raw.to_dict())
+        return self
+
+    def __getitem__(self, key):
+        try:
+            getter = self._getters[key]
+        except (KeyError, TypeError):
+            return self._materialize()[key]
+        return getter(self._raw)
+
+    def get(self, key, default=None):
+        try:
+            getter = self._getters[key]
+        except (KeyError, TypeError):
+            return self._materialize().get(key, default)
+        return getter(self._raw)
+
+    def __contains__(self, key):
+        try:
+            if key in self._getters:
+                return True
+        except TypeError:
+            pass
+        return key in self._materialize()
+
+
+# Used by _LazyContext, every other dict method gets the whole context first.
+def _materializing_method(name):
+    def method(self, *argv, **argd):
+        return getattr(self._materialize(), name)(*argv, **argd)
+
+    method.__name__ = name
+    return method
+
+
+for _name in (
+    "__iter__",
+    "__len__",
+    "__repr__",
+    "__eq__",
+    "__ne__",
+    "__or__",
+    "__ror__",
+    "__ior__",
+    "__reversed__",
+    "__setitem__",
+    "__delitem__",
+    "__reduce__",
+    "__reduce_ex__",
+    "keys",
+    "values",
+    "items",
+    "copy",
+    "pop",
+    "popitem",
+    "setdefault",
+    "update",
+    "clear",
+):
+    if hasattr(dict, _name):
+        setattr(_LazyContext, _name, _materializing_method(_name))
+del _name
+
 
 # --- LDT_ENTRY structure ------------------------------------------------------
 
@@ -842,7 +1031,6 @@ class Context(dict):
 
 
 class _LDT_ENTRY_BYTES_(Structure):
-    _pack_ = 1
     _fields_ = [
         ("BaseMid", BYTE),
         ("Flags1", BYTE),
@@ -852,7 +1040,6 @@ class _LDT_ENTRY_BYTES_(Structure):
 
 
 class _LDT_ENTRY_BITS_(Structure):
-    _pack_ = 1
     _fields_ = [
         ("BaseMid", DWORD, 8),
         ("Type", DWORD, 5),
@@ -868,7 +1055,6 @@ class _LDT_ENTRY_BITS_(Structure):
 
 
 class _LDT_ENTRY_HIGHWORD_(Union):
-    _pack_ = 1
     _fields_ = [
         ("Bytes", _LDT_ENTRY_BYTES_),
         ("Bits", _LDT_ENTRY_BITS_),
@@ -894,7 +1080,6 @@ class LDT_ENTRY(Structure):
     individual bytes or as bit fields for fine-grained control.
     """
 
-    _pack_ = 1
     _fields_ = [
         ("LimitLow", WORD),
         ("BaseLow", WORD),
@@ -961,6 +1146,67 @@ PWOW64_LDT_ENTRY = POINTER(WOW64_LDT_ENTRY)
 
 ###############################################################################
 
+# Used by the API wrappers below. The functions are bound to private
+# prototypes the first time they're called, rather than setting up the shared
+# windll.kernel32 function objects, since context_i386 sets its own argtypes
+# on those and both modules are used on a 32 bit host under WOW64.
+# Doing it at import time is not an option since the Wow64 functions don't
+# exist in all versions of Windows. GetThreadContext and SetThreadContext are
+# called on every debug event, so they check for errors inline instead of
+# paying for an extra Python level errcheck call.
+_kernel32_prototypes = {
+    "GetThreadSelectorEntry": (
+        WINFUNCTYPE(BOOL, HANDLE, DWORD, LPLDT_ENTRY),
+        RaiseIfZero,
+    ),
+    "GetThreadContext": (WINFUNCTYPE(BOOL, HANDLE, LPCONTEXT), None),
+    "SetThreadContext": (WINFUNCTYPE(BOOL, HANDLE, LPCONTEXT), None),
+    "Wow64GetThreadSelectorEntry": (
+        WINFUNCTYPE(BOOL, HANDLE, DWORD, PWOW64_LDT_ENTRY),
+        RaiseIfZero,
+    ),
+    "Wow64ResumeThread": (WINFUNCTYPE(DWORD, HANDLE), None),
+    "Wow64SuspendThread": (WINFUNCTYPE(DWORD, HANDLE), None),
+    "Wow64GetThreadContext": (
+        WINFUNCTYPE(BOOL, HANDLE, PWOW64_CONTEXT),
+        RaiseIfZero,
+    ),
+    "Wow64SetThreadContext": (
+        WINFUNCTYPE(BOOL, HANDLE, PWOW64_CONTEXT),
+        RaiseIfZero,
+    ),
+}
+_kernel32_functions = {}
+
+
+def _get_kernel32_function(name):
+    try:
+        return _kernel32_functions[name]
+    except KeyError:
+        pass
+    prototype, errcheck = _kernel32_prototypes[name]
+    function = prototype((name, windll.kernel32))
+    if errcheck is not None:
+        function.errcheck = errcheck
+    _kernel32_functions[name] = function
+    return function
+
+
+# Used by Wow64GetThreadContext. When the context is converted into a
+# dictionary the structure is thrown away right after the call, so each
+# thread keeps one around to reuse instead of allocating a new one.
+_scratch = threading.local()
+
+
+def _get_scratch_wow64_context():
+    Context = getattr(_scratch, "wow64_context", None)
+    if Context is None:
+        Context = WOW64_CONTEXT()
+        _scratch.wow64_context = Context
+    else:
+        ctypes.memset(byref(Context), 0, sizeof(WOW64_CONTEXT))
+    return Context
+
 
 # BOOL WINAPI GetThreadSelectorEntry(
 #   __in   HANDLE hThread,
@@ -968,10 +1214,7 @@ PWOW64_LDT_ENTRY = POINTER(WOW64_LDT_ENTRY)
 #   __out  LPLDT_ENTRY lpSelectorEntry
 # );
 def GetThreadSelectorEntry(hThread, dwSelector):
-    _GetThreadSelectorEntry = windll.kernel32.GetThreadSelectorEntry
-    _GetThreadSelectorEntry.argtypes = [HANDLE, DWORD, LPLDT_ENTRY]
-    _GetThreadSelectorEntry.restype = bool
-    _GetThreadSelectorEntry.errcheck = RaiseIfZero
+    _GetThreadSelectorEntry = _get_kernel32_function("GetThreadSelectorEntry")
 
     ldt = LDT_ENTRY()
     _GetThreadSelectorEntry(hThread, dwSelector, byref(ldt))
@@ -983,19 +1226,19 @@ def GetThreadSelectorEntry(hThread, dwSelector):
 #   __inout  LPCONTEXT lpContext
 # );
 def GetThreadContext(hThread, ContextFlags=None, raw=False):
-    _GetThreadContext = windll.kernel32.GetThreadContext
-    _GetThreadContext.argtypes = [HANDLE, LPCONTEXT]
-    _GetThreadContext.restype = bool
-    _GetThreadContext.errcheck = RaiseIfZero
+    _GetThreadContext = _get_kernel32_function("GetThreadContext")
 
     if ContextFlags is None:
-        ContextFlags = CONTEXT_ALL | CONTEXT_AMD64
+        ContextFlags = CONTEXT_ALL
     Context = CONTEXT()
     Context.ContextFlags = ContextFlags
-    _GetThreadContext(hThread, byref(Context))
+    if not _GetThreadContext(hThread, byref(Context)):
+        raise ctypes.WinError()
     if raw:
         return Context
-    return Context.to_dict()
+    # Registers are converted on demand, see _LazyContext for the one
+    # limitation this has when compared to a plain dictionary.
+    return _LazyContext(Context)
 
 
 # BOOL WINAPI SetThreadContext(
@@ -1003,14 +1246,16 @@ def GetThreadContext(hThread, ContextFlags=None, raw=False):
 #   __in  const CONTEXT* lpContext
 # );
 def SetThreadContext(hThread, lpContext):
-    _SetThreadContext = windll.kernel32.SetThreadContext
-    _SetThreadContext.argtypes = [HANDLE, LPCONTEXT]
-    _SetThreadContext.restype = bool
-    _SetThreadContext.errcheck = RaiseIfZero
+    _SetThreadContext = _get_kernel32_function("SetThreadContext")
 
-    if isinstance(lpContext, dict):
+    to_struct = getattr(lpContext, "to_struct", None)
+    if to_struct is not None:
+        lpContext = to_struct()
+    else:
+        # Plain dictionaries.
         lpContext = CONTEXT.from_dict(lpContext)
-    _SetThreadContext(hThread, byref(lpContext))
+    if not _SetThreadContext(hThread, byref(lpContext)):
+        raise ctypes.WinError()
 
 
 # BOOL Wow64GetThreadSelectorEntry(
@@ -1019,10 +1264,7 @@ def SetThreadContext(hThread, lpContext):
 #   __out  PWOW64_LDT_ENTRY lpSelectorEntry
 # );
 def Wow64GetThreadSelectorEntry(hThread, dwSelector):
-    _Wow64GetThreadSelectorEntry = windll.kernel32.Wow64GetThreadSelectorEntry
-    _Wow64GetThreadSelectorEntry.argtypes = [HANDLE, DWORD, PWOW64_LDT_ENTRY]
-    _Wow64GetThreadSelectorEntry.restype = bool
-    _Wow64GetThreadSelectorEntry.errcheck = RaiseIfZero
+    _Wow64GetThreadSelectorEntry = _get_kernel32_function("Wow64GetThreadSelectorEntry")
 
     lpSelectorEntry = WOW64_LDT_ENTRY()
     _Wow64GetThreadSelectorEntry(hThread, dwSelector, byref(lpSelectorEntry))
@@ -1033,9 +1275,7 @@ def Wow64GetThreadSelectorEntry(hThread, dwSelector):
 #   __in  HANDLE hThread
 # );
 def Wow64ResumeThread(hThread):
-    _Wow64ResumeThread = windll.kernel32.Wow64ResumeThread
-    _Wow64ResumeThread.argtypes = [HANDLE]
-    _Wow64ResumeThread.restype = DWORD
+    _Wow64ResumeThread = _get_kernel32_function("Wow64ResumeThread")
 
     previousCount = _Wow64ResumeThread(hThread)
     if previousCount == DWORD(-1).value:
@@ -1047,9 +1287,7 @@ def Wow64ResumeThread(hThread):
 #   __in  HANDLE hThread
 # );
 def Wow64SuspendThread(hThread):
-    _Wow64SuspendThread = windll.kernel32.Wow64SuspendThread
-    _Wow64SuspendThread.argtypes = [HANDLE]
-    _Wow64SuspendThread.restype = DWORD
+    _Wow64SuspendThread = _get_kernel32_function("Wow64SuspendThread")
 
     previousCount = _Wow64SuspendThread(hThread)
     if previousCount == DWORD(-1).value:
@@ -1066,16 +1304,16 @@ def Wow64SuspendThread(hThread):
 #   __inout  PWOW64_CONTEXT lpContext
 # );
 def Wow64GetThreadContext(hThread, ContextFlags=None, raw=False):
-    _Wow64GetThreadContext = windll.kernel32.Wow64GetThreadContext
-    _Wow64GetThreadContext.argtypes = [HANDLE, PWOW64_CONTEXT]
-    _Wow64GetThreadContext.restype = bool
-    _Wow64GetThreadContext.errcheck = RaiseIfZero
+    _Wow64GetThreadContext = _get_kernel32_function("Wow64GetThreadContext")
 
     # XXX doesn't exist in XP 64 bits
 
-    Context = WOW64_CONTEXT()
+    if raw:
+        Context = WOW64_CONTEXT()
+    else:
+        Context = _get_scratch_wow64_context()
     if ContextFlags is None:
-        Context.ContextFlags = WOW64_CONTEXT_ALL | WOW64_CONTEXT_i386
+        Context.ContextFlags = WOW64_CONTEXT_ALL
     else:
         Context.ContextFlags = ContextFlags
     _Wow64GetThreadContext(hThread, byref(Context))
@@ -1089,14 +1327,19 @@ def Wow64GetThreadContext(hThread, ContextFlags=None, raw=False):
 #   __in  const WOW64_CONTEXT *lpContext
 # );
 def Wow64SetThreadContext(hThread, lpContext):
-    _Wow64SetThreadContext = windll.kernel32.Wow64SetThreadContext
-    _Wow64SetThreadContext.argtypes = [HANDLE, PWOW64_CONTEXT]
-    _Wow64SetThreadContext.restype = bool
-    _Wow64SetThreadContext.errcheck = RaiseIfZero
+    _Wow64SetThreadContext = _get_kernel32_function("Wow64SetThreadContext")
 
     # XXX doesn't exist in XP 64 bits
 
-    if isinstance(lpContext, dict):
+    to_struct = getattr(lpContext, "to_struct", None)
+    if to_struct is not None:
+        lpContext = to_struct()
+        # Wow64GetThreadContext returns i386 dictionaries, whose structure
+        # has the same layout but isn't accepted as a WOW64_CONTEXT.
+        if type(lpContext) is context_i386.CONTEXT:
+            lpContext = WOW64_CONTEXT.from_buffer_copy(lpContext)
+    else:
+        # Plain dictionaries.
         lpContext = WOW64_CONTEXT.from_dict(lpContext)
     _Wow64SetThreadContext(hThread, byref(lpContext))
 
@@ -56,6 +56,8 @@ The module also provides Win32 API wrappers for context operations:
    see :mod:`context_amd64`.
 """
 
+from operator import attrgetter
+
 from .defines import (
     BYTE,
     DWORD,
@@ -382,6 +384,13 @@ class CONTEXT(Structure):
     _ctx_int = ("Edi", "Esi", "Ebx", "Edx", "Ecx", "Eax")
     _ctx_ctrl = ("Ebp", "Eip", "SegCs", "EFlags", "Esp", "SegSs")
 
+    # Bulk getters for each register group, each returns a tuple of values
+    # in the same order as the names above.
+    _ctx_debug_get = attrgetter(*_ctx_debug)
+    _ctx_segs_get = attrgetter(*_ctx_segs)
+    _ctx_int_get = attrgetter(*_ctx_int)
+    _ctx_ctrl_get = attrgetter(*_ctx_ctrl)
+
     @classmethod
     def from_dict(cls, ctx):
         ctx = Context(ctx)
@@ -414,19 +423,15 @@ class CONTEXT(Structure):
         ContextFlags = self.ContextFlags
         ctx["ContextFlags"] = ContextFlags
         if (ContextFlags & CONTEXT_DEBUG_REGISTERS) == CONTEXT_DEBUG_REGISTERS:
-            for key in self._ctx_debug:
-                ctx[key] = getattr(self, key)
+            ctx.update(zip(self._ctx_debug, self._ctx_debug_get(self)))
         if (ContextFlags & CONTEXT_FLOATING_POINT) == CONTEXT_FLOATING_POINT:
             ctx["FloatSave"] = self.FloatSave.to_dict()
         if (ContextFlags & CONTEXT_SEGMENTS) == CONTEXT_SEGMENTS:
-            for key in self._ctx_segs:
-                ctx[key] = getattr(self, key)
+            ctx.update(zip(self._ctx_segs, self._ctx_segs_get(self)))
         if (ContextFlags & CONTEXT_INTEGER) == CONTEXT_INTEGER:
-            for key in self._ctx_int:
-                ctx[key] = getattr(self, key)
+            ctx.update(zip(self._ctx_int, self._ctx_int_get(self)))
         if (ContextFlags & CONTEXT_CONTROL) == CONTEXT_CONTROL:
-            for key in self._ctx_ctrl:
-                ctx[key] = getattr(self, key)
+            ctx.update(zip(self._ctx_ctrl, self._ctx_ctrl_get(self)))
         if (ContextFlags & CONTEXT_EXTENDED_REGISTERS) == CONTEXT_EXTENDED_REGISTERS:
             er = [
                 self.ExtendedRegisters[index]
@@ -436,6 +441,14 @@ class CONTEXT(Structure):
             ctx["ExtendedRegisters"] = er
         return ctx
 
+    def to_struct(self):
+        """
+        :rtype: CONTEXT
+        :return: This same structure. Lets :func:`SetThreadContext` take
+            either a :class:`CONTEXT` or a :class:`Context` without checking.
+        """
+        return self
+
 
 PCONTEXT = POINTER(CONTEXT)
 LPCONTEXT = PCONTEXT
@@ -525,6 +538,13 @@ class Context(dict):
         """,
     )
 
+    def to_struct(self):
+        """
+        :rtype: CONTEXT
+        :return: Context structure with the values in this dictionary.
+        """
+        return CONTEXT.from_dict(self)
+
 
 # --- LDT_ENTRY structure ------------------------------------------------------
 
@@ -649,7 +669,7 @@ def GetThreadContext(hThread, ContextFlags=None, raw=False):
     _GetThreadContext.errcheck = RaiseIfZero
 
     if ContextFlags is None:
-        ContextFlags = CONTEXT_ALL | CONTEXT_i386
+        ContextFlags = CONTEXT_ALL
     Context = CONTEXT()
     Context.ContextFlags = ContextFlags
     _GetThreadContext(hThread, byref(Context))
@@ -668,7 +688,11 @@ def SetThreadContext(hThread, lpContext):
     _SetThreadContext.restype = bool
     _SetThreadContext.errcheck = RaiseIfZero
 
-    if isinstance(lpContext, dict):
+    to_struct = getattr(lpContext, "to_struct", None)
+    if to_struct is not None:
+        lpContext = to_struct()
+    else:
+        # Plain dictionaries.
         lpContext = CONTEXT.from_dict(lpContext)
     _SetThreadContext(hThread, byref(lpContext))
 
@@ -58,6 +58,7 @@ from .defines import (
     sizeof,
     windll,
 )
+from .kernel32 import MEMORY_BASIC_INFORMATION, MemoryBasicInformation
 from .peb_teb import CLIENT_ID
 
 # ==============================================================================
@@ -70,12 +71,17 @@ _all.add("peb_teb")
 # --- Types --------------------------------------------------------------------
 
 SYSDBG_COMMAND = DWORD
+SYSTEM_INFORMATION_CLASS = DWORD
 PROCESSINFOCLASS = DWORD
 THREADINFOCLASS = DWORD
+MEMORY_INFORMATION_CLASS = DWORD
 FILE_INFORMATION_CLASS = DWORD
 
 # --- Constants ----------------------------------------------------------------
 
+# NTSTATUS codes
+STATUS_INFO_LENGTH_MISMATCH = 0xC0000004
+
 # DEP flags for ProcessExecuteFlags
 MEM_EXECUTE_OPTION_ENABLE = 1
 MEM_EXECUTE_OPTION_DISABLE = 2
@@ -251,6 +257,13 @@ FileInheritContentIndexInformation = 37
 FileOleInformation = 39
 FileMaximumInformation = 40
 
+# MEMORY_INFORMATION_CLASS
+# (MemoryBasicInformation is 0, but that name is taken by the kernel32 class)
+MemoryWorkingSetInformation = 1
+MemoryMappedFilenameInformation = 2
+MemoryRegionInformation = 3
+MemoryWorkingSetExInformation = 4
+
 # From http://www.nirsoft.net/kernel_struct/vista/EXCEPTION_DISPOSITION.html
 # typedef enum _EXCEPTION_DISPOSITION
 # {
@@ -348,6 +361,26 @@ class FILE_NAME_INFORMATION(Structure):
     ]
 
 
+# --- MEMORY_REGION_INFORMATION structure --------------------------------------
+
+
+# typedef struct _MEMORY_REGION_INFORMATION {
+#     PVOID AllocationBase;
+#     ULONG AllocationProtect;
+#     ULONG RegionType;
+#     SIZE_T RegionSize;
+#     SIZE_T CommitSize;
+# } MEMORY_REGION_INFORMATION, *PMEMORY_REGION_INFORMATION;
+class MEMORY_REGION_INFORMATION(Structure):
+    _fields_ = [
+        ("AllocationBase", SIZE_T),  # remote pointer
+        ("AllocationProtect", ULONG),
+        ("RegionType", ULONG),
+        ("RegionSize", SIZE_T),
+        ("CommitSize", SIZE_T),
+    ]
+
+
 # --- SYSDBG_MSR structure and constants ---------------------------------------
 
 SysDbgReadMsr = 16
@@ -388,6 +421,53 @@ class IO_STATUS_BLOCK(Structure):
 
 PIO_STATUS_BLOCK = POINTER(IO_STATUS_BLOCK)
 
+# --- SYSTEM_PROCESS_INFORMATION structure -------------------------------------
+
+
+# typedef struct _SYSTEM_PROCESS_INFORMATION {
+#     ULONG NextEntryOffset;
+#     ULONG NumberOfThreads;
+#     LARGE_INTEGER WorkingSetPrivateSize;
+#     ULONG HardFaultCount;
+#     ULONG NumberOfThreadsHighWatermark;
+#     ULONGLONG CycleTime;
+#     LARGE_INTEGER CreateTime;
+#     LARGE_INTEGER UserTime;
+#     LARGE_INTEGER KernelTime;
+#     UNICODE_STRING ImageName;
+#     KPRIORITY BasePriority;
+#     HANDLE UniqueProcessId;
+#     HANDLE InheritedFromUniqueProcessId;
+#     ULONG HandleCount;
+#     ULONG SessionId;
+#     ULONG_PTR UniqueProcessKey;
+#     ...
+# } SYSTEM_PROCESS_INFORMATION, *PSYSTEM_PROCESS_INFORMATION;
+#
+# Only the fixed header is defined here. Each entry is followed by the rest
+# of the process counters and an array of SYSTEM_THREAD_INFORMATION, so the
+# entries must be walked using NextEntryOffset rather than sizeof.
+class SYSTEM_PROCESS_INFORMATION(Structure):
+    _fields_ = [
+        ("NextEntryOffset", ULONG),
+        ("NumberOfThreads", ULONG),
+        ("WorkingSetPrivateSize", LONGLONG),  # LARGE_INTEGER
+        ("HardFaultCount", ULONG),
+        ("NumberOfThreadsHighWatermark", ULONG),
+        ("CycleTime", ULONGLONG),
+        ("CreateTime", LONGLONG),  # LARGE_INTEGER
+        ("UserTime", LONGLONG),  # LARGE_INTEGER
+        ("KernelTime", LONGLONG),  # LARGE_INTEGER
+        ("ImageName", UNICODE_STRING),
+        ("BasePriority", SDWORD),  # KPRIORITY
+        ("UniqueProcessId", ULONG_PTR),
+        ("InheritedFromUniqueProcessId", ULONG_PTR),
+        ("HandleCount", ULONG),
+        ("SessionId", ULONG),
+        ("UniqueProcessKey", ULONG_PTR),
+    ]
+
+
 # --- ntdll.dll ----------------------------------------------------------------
 
 
@@ -645,6 +725,103 @@ def NtQueryInformationFile(FileHandle, FileInformationClass, FileInformation, Le
 ZwQueryInformationFile = NtQueryInformationFile
 
 
+# NTSTATUS NTAPI NtQueryVirtualMemory(
+#   _In_      HANDLE ProcessHandle,
+#   _In_opt_  PVOID BaseAddress,
+#   _In_      MEMORY_INFORMATION_CLASS MemoryInformationClass,
+#   _Out_     PVOID MemoryInformation,
+#   _In_      SIZE_T MemoryInformationLength,
+#   _Out_opt_ PSIZE_T ReturnLength
+# );
+def NtQueryVirtualMemory(
+    ProcessHandle, BaseAddress, MemoryInformationClass=0, MemoryInformation=None
+):
+    _NtQueryVirtualMemory = windll.ntdll.NtQueryVirtualMemory
+    _NtQueryVirtualMemory.argtypes = [
+        HANDLE,
+        PVOID,
+        MEMORY_INFORMATION_CLASS,
+        PVOID,
+        SIZE_T,
+        PVOID,
+    ]
+    _NtQueryVirtualMemory.restype = NTSTATUS
+    if MemoryInformation is None:
+        if MemoryInformationClass == 0:
+            MemoryInformation = MEMORY_BASIC_INFORMATION()
+        elif MemoryInformationClass == MemoryRegionInformation:
+            MemoryInformation = MEMORY_REGION_INFORMATION()
+        else:
+            raise Exception(
+                "Unknown MemoryInformationClass, use an explicit MemoryInformation buffer instead"
+            )
+    ntstatus = _NtQueryVirtualMemory(
+        ProcessHandle,
+        BaseAddress,
+        MemoryInformationClass,
+        byref(MemoryInformation),
+        sizeof(MemoryInformation),
+        None,
+    )
+    if ntstatus != 0:
+        raise ctypes.WinError(RtlNtStatusToDosError(ntstatus))
+    if MemoryInformationClass == 0:
+        return MemoryBasicInformation(MemoryInformation)
+    return MemoryInformation
+
+
+ZwQueryVirtualMemory = NtQueryVirtualMemory
+
+
+# NTSTATUS WINAPI NtQuerySystemInformation(
+#   __in       SYSTEM_INFORMATION_CLASS SystemInformationClass,
+#   __inout    PVOID SystemInformation,
+#   __in       ULONG SystemInformationLength,
+#   __out_opt  PULONG ReturnLength
+# );
+def NtQuerySystemInformation(SystemInformationClass, SystemInformation=None):
+    """
+    Returns a tuple of the ctypes buffer holding the requested information
+    and the number of bytes written to it. Structures in the buffer may
+    point inside of it, so it must be kept alive while they're being used.
+
+    If no buffer is given, one is allocated and grown as needed. A buffer
+    returned by a previous call may be passed back in to reuse it; it is
+    replaced by a bigger one if it's too small.
+    """
+    _NtQuerySystemInformation = windll.ntdll.NtQuerySystemInformation
+    _NtQuerySystemInformation.argtypes = [
+        SYSTEM_INFORMATION_CLASS,
+        PVOID,
+        ULONG,
+        PULONG,
+    ]
+    _NtQuerySystemInformation.restype = NTSTATUS
+    if SystemInformation is None:
+        SystemInformation = ctypes.create_string_buffer(0x8000)
+    ReturnLength = ULONG(0)
+    while True:
+        ntstatus = _NtQuerySystemInformation(
+            SystemInformationClass,
+            byref(SystemInformation),
+            sizeof(SystemInformation),
+            byref(ReturnLength),
+        )
+        if ntstatus & 0xFFFFFFFF != STATUS_INFO_LENGTH_MISMATCH:
+            break
+
+        # The information may keep growing between calls,
+        # so leave some room to spare when making the buffer bigger.
+        size = max(sizeof(SystemInformation) * 2, ReturnLength.value + 0x1000)
+        SystemInformation = ctypes.create_string_buffer(size)
+    if ntstatus != 0:
+        raise ctypes.WinError(RtlNtStatusToDosError(ntstatus))
+    return SystemInformation, ReturnLength.value
+
+
+ZwQuerySystemInformation = NtQuerySystemInformation
+
+
 # DWORD STDCALL CsrGetProcessId (VOID);
 def CsrGetProcessId():
     _CsrGetProcessId = windll.ntdll.CsrGetProcessId